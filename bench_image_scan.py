@@ -0,0 +1,97 @@
+import os
+import re
+import time
+from export_redmine_wiki import scan_wiki_refs
+
+# === Micro-benchmark of the embedded image scanner of export_redmine_wiki.py ===
+# Runs scan_wiki_refs() over the largest pages of a wiki export (the <page>.txt files),
+# next to the previous multi-pass regex scan, plus synthetic worst-case inputs to check
+# that scan time grows linearly with page size.
+
+# The legacy scan is quadratic on some synthetic inputs, so it is only timed up to this size
+LEGACY_MAX_SYNTHETIC = 100000
+
+def legacy_scan(content):
+    """ The multi-pass scan used before scan_wiki_refs(), for comparison. """
+    textile_imgs = re.findall(r'!(?:\{[^\}]*\})?(^!\s+\.\s+)(?:\([^\)]*\))?!', content)
+    textile_imgs = [s.split("}", 1)[-1] for s in textile_imgs]
+    textile_imgs = [s.split("(", 1)[0] for s in textile_imgs]
+    html_imgs = re.findall(r'<img [^>]*src=[\'"]([^\'"]+)[\'"]', content)
+    return set(textile_imgs + html_imgs)
+
+def timeit(func, content, repeat):
+    """ Best time of repeat runs of func(content), in seconds. """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def load_pages(wiki_dir):
+    """ Read the content (after the metadata header) of every <page>.txt of a wiki export. """
+    pages = {}
+    for fname in os.listdir(wiki_dir):
+        if not fname.endswith('.txt'):
+            continue
+        with open(os.path.join(wiki_dir, fname), 'r', encoding='utf-8') as f:
+            text = f.read()
+        pages[fname[:-4]] = text.split("\n---\n\n", 1)[-1]
+    return pages
+
+def synthetic_pages(size):
+    """ Adversarial inputs of about size characters: unterminated tags/images and dense references. """
+    return {
+        'unclosed textile images': '!' + 'a' * size,
+        'unclosed textile styles': '!{' * (size // 2),
+        'unclosed img tags': '<img ' * (size // 5),
+        'dense textile images': '!a.png! ' * (size // 8),
+        'dense img tags': '<img src="a.png">' * (size // 17),
+        'unclosed pre block': '<pre>' + '!a.png! ' * (size // 8),
+    }
+
+def print_row(name, content, repeat, legacy):
+    size_mb = len(content) / (1024 * 1024)
+    elapsed = timeit(scan_wiki_refs, content, repeat)
+    row = f" {name[:40]:<40} {len(content):>10} {elapsed * 1000:>10.2f} ms {size_mb / elapsed if elapsed else 0:>8.1f} MB/s"
+    if legacy:
+        row += f"   (legacy: {timeit(legacy_scan, content, repeat) * 1000:.2f} ms)"
+    print(row)
+
+
+# Parse arguments:
+#  --wiki-dir => Wiki export folder (as written by export_redmine_wiki.py) to benchmark on
+#  --top => Number of largest pages to report individually
+#  --repeat => Runs per measurement (the best one is reported)
+#  --synthetic => Comma-separated sizes of the synthetic worst-case inputs
+#  --legacy => Also time the previous multi-pass regex scan (on synthetic inputs up to LEGACY_MAX_SYNTHETIC)
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the embedded image scanner of the wiki exporter')
+    parser.add_argument('--wiki-dir', type=str, help='Wiki export folder (as written by export_redmine_wiki.py) to benchmark on')
+    parser.add_argument('--top', type=int, default=10, help='Number of largest pages to report individually')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (the best one is reported)')
+    parser.add_argument('--synthetic', type=str, default='100000,1000000', help='Comma-separated sizes of the synthetic worst-case inputs')
+    parser.add_argument('--legacy', action='store_true', help='Also time the previous multi-pass regex scan')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.wiki_dir:
+        pages = load_pages(args.wiki_dir)
+        largest = sorted(pages, key=lambda t: len(pages[t]), reverse=True)[:args.top]
+        print(f"📄 {len(pages)} pages in '{args.wiki_dir}', {args.top} largest:")
+        for title in largest:
+            print_row(title, pages[title], args.repeat, args.legacy)
+        print_row('(all pages)', '\n'.join(pages.values()), args.repeat, args.legacy)
+
+    for size in [int(s) for s in args.synthetic.split(',') if s.strip()]:
+        print(f"\n🧪 Synthetic inputs of {size} characters:")
+        for name, content in synthetic_pages(size).items():
+            print_row(name, content, args.repeat, args.legacy and size <= LEGACY_MAX_SYNTHETIC)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import hashlib
+import inspect
+import tempfile
+import threading
+
+# === Cache of conversion stage outputs, shared by import_to_confluence.py and import_to_jira.py ===
+# Each stage output is stored under a key hashing the stage fingerprint (the source code of
+# the stage and of the rules it depends on, plus converter versions), the stage options and
+# its input text. Changing a rule only invalidates its own stage: documents whose output of
+# that stage stays the same are still found in the cache by the following stages.
+
+CACHE_FOLDER = '.conversion_cache'
+
+
+def fingerprint(*parts):
+    """ Hash the given functions (by source code), regexes, tables and version strings. """
+    h = hashlib.sha256()
+    for part in parts:
+        if inspect.isfunction(part):
+            try:
+                part = inspect.getsource(part)
+            except (OSError, TypeError):
+                part = part.__code__.co_code.hex()
+        elif hasattr(part, 'pattern'):
+            part = (part.pattern, part.flags)
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class ConversionCache:
+    """
+    On-disk cache of converted documents, as <root>/<stage>/<xx>/<key> text files.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, stage, stage_fingerprint, text, options=()):
+        h = hashlib.sha256()
+        for part in (stage, stage_fingerprint, repr(options), text):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def cached(self, stage, stage_fingerprint, func, text, options=()):
+        """
+        Return func(text), read from the cache when the same stage (code and options)
+        already converted the same text, and stored into it otherwise.
+        """
+        key = self.key(stage, stage_fingerprint, text, options)
+        path = os.path.join(self.root, stage, key[:2], key)
+
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                output = f.read()
+            with self.lock:
+                self.hits += 1
+            return output
+        except FileNotFoundError:
+            pass
+
+        output = func(text)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and pool worker processes, which may convert the same text at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{key}.", suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(output)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.misses += 1
+        return output
+
+    def report(self):
+        print(f"🗃️  Conversion cache: {self.hits} stage results reused, {self.misses} converted.")
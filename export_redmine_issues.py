@@ -1,7 +1,13 @@
-import requests
 import os
 import json
 import time
+import gzip
+import sqlite3
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from redmine_common import create_session, download_file, is_attachment_current, fetch_projects, issue_text, BlobStore
 
 # === Configuration ===
 project_id = 'evidevs'
@@ -10,109 +16,493 @@ base_url = 'https://dev.crt0.net'
 headers = {'X-Redmine-API-Key': api_key}
 
 output_folder = 'redmine_issues'
-os.makedirs(output_folder, exist_ok=True)
 
 # === Change offset in case of download disruption to resume work ===
 offset = 0
+# === Issues per /issues.json page (Redmine caps it to its configured maximum, 100 by default) ===
 limit = 100
-all_issues = []
 
-print(f"\U0001F4E5 Starting to fetch issues from '{project_id}'")
+# === Number of issues fetched/downloaded in parallel ===
+workers = 8
 
-# === Step 1: Paginate through all issues (including closed) ===
-while True:
-    url = f'{base_url}/issues.json?project_id={project_id}&status_id=*&sort=id:asc&offset={offset}&limit={limit}'
-    response = requests.get(url, headers=headers)
+# === Shared keep-alive session (created on main) ===
+session = None
+
+# === Incremental sync state (watermark of last successful export) ===
+STATE_FILE = '.export_state.json'
+
+# === Optional content-addressed attachment store (--blob-store) ===
+blob_store = None
+
+# === Checkpoint of an ongoing export (used by --resume) ===
+CHECKPOINT_FILE = '.export_checkpoint.json'
+
+# === Rounds over the retry queue of failed issues, at the end of the export ===
+retry_rounds = 3
+
+
+def load_json_file(folder, filename):
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_json_file(folder, filename, data):
+    # Write to a temp file and rename, so a crash never leaves a truncated file
+    path = os.path.join(folder, filename)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_state(folder):
+    return load_json_file(folder, STATE_FILE)
+
+def save_state(folder, state):
+    save_json_file(folder, STATE_FILE, state)
+
+def load_checkpoint(folder):
+    return load_json_file(folder, CHECKPOINT_FILE)
+
+def save_checkpoint(folder, checkpoint):
+    save_json_file(folder, CHECKPOINT_FILE, checkpoint)
+
+def clear_checkpoint(folder):
+    path = os.path.join(folder, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+def fetch_issues_page(project, offset, limit, updated_since=None):
+    url = f'{base_url}/issues.json?project_id={project}&status_id=*&sort=id:asc&offset={offset}&limit={limit}'
+    if updated_since:
+        # Redmine filter syntax: updated_on=>=<timestamp> (url-encoded)
+        url += f'&updated_on=%3E%3D{updated_since}'
+    response = session.get(url)
 
     if response.status_code != 200:
         print(f"❌ Failed to fetch issues: {response.status_code}")
         print(response.text)
-        break
-
-    data = response.json()
-    issues = data.get('issues', [])
-    if not issues:
-        break
-
-    print(f"🔹 Retrieved {len(issues)} issues (offset {offset})")
-
-    for issue in issues:
-        issue_id = issue['id']
-        json_path = os.path.join(output_folder, f'issue_{issue_id}.json')
-        txt_path = os.path.join(output_folder, f'issue_{issue_id}.txt')
-
-        issue_url = f'{base_url}/issues/{issue_id}.json?include=journals,attachments,changesets'
-        detail_resp = requests.get(issue_url, headers=headers)
-
-        if detail_resp.status_code != 200:
-            print(f"⚠️ Failed to get full data for issue #{issue_id}")
-            raise Exception(f"Failed to get issue #{issue_id}: {detail_resp.status_code}")
-
-        print(f"   📝 Processing issue #{issue_id}")
-
-        full_data = detail_resp.json().get('issue', {})
-        all_issues.append(full_data)
-
-        # === Save JSON ===
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(full_data, f, indent=2)
-
-        # === Save as readable text ===
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(f"Issue #{issue_id}\n")
-            f.write(f"Subject: {full_data.get('subject')}\n")
-            f.write(f"Status: {full_data.get('status', {}).get('name')}\n")
-            f.write(f"Tracker: {full_data.get('tracker', {}).get('name')}\n")
-            f.write(f"Priority: {full_data.get('priority', {}).get('name')}\n")
-            f.write(f"Assigned to: {full_data.get('assigned_to', {}).get('name', 'Unassigned')}\n")
-            f.write(f"Author: {full_data.get('author', {}).get('name')}\n")
-            f.write(f"Created: {full_data.get('created_on')}\n")
-            f.write(f"Updated: {full_data.get('updated_on')}\n")
-            f.write(f"Description:\n{full_data.get('description', '')}\n\n")
-
-            # Journals (comments)
-            f.write("--- Comments ---\n")
-            for journal in full_data.get('journals', []):
-                user = journal.get('user', {}).get('name', 'Unknown')
-                notes = journal.get('notes', '')
-                created = journal.get('created_on')
-                if notes:
-                    f.write(f"\n[{created}] {user}:\n{notes}\n")
-
-        # === Step 2: Download issue as PDF ===
-#        pdf_url = f'{base_url}/issues/{issue_id}.pdf'
-#        print(f"   📄 Downloading PDF for issue #{issue_id}")
-#        pdf_resp = requests.get(pdf_url, headers=headers)
-#        if pdf_resp.status_code == 200:
-#            pdf_path = os.path.join(output_folder, f'issue_{issue_id}.pdf')
-#            with open(pdf_path, 'wb') as f:
-#                f.write(pdf_resp.content)
-#        else:
-#            print(f"   ⚠️ Failed to download PDF for issue #{issue_id}: {pdf_resp.status_code}")
-
-        # === Step 3: Download attachments ===
-        attachments = full_data.get('attachments', [])
-        if attachments:
-            attachment_dir = os.path.join(output_folder, f'issue_{issue_id}_attachments')
-            os.makedirs(attachment_dir, exist_ok=True)
-
-            for att in attachments:
-                filename = att.get('filename')
-                content_url = att.get('content_url')
-                if not filename or not content_url:
-                    continue
-
-                print(f"   📎 Downloading attachment: {filename}")
-                att_resp = requests.get(content_url, headers=headers)
-                if att_resp.status_code == 200:
-                    att_path = os.path.join(attachment_dir, filename)
-                    with open(att_path, 'wb') as f:
-                        f.write(att_resp.content)
-                else:
-                    print(f"   ⚠️ Failed to download attachment '{filename}': {att_resp.status_code}")
-                    raise Exception(f"Failed to download attachment '{filename}'")
-
-    offset += limit
-    time.sleep(0.5)  # Polite delay to avoid hammering the server
-
-print(f"\n✅ Completed. Total issues downloaded: {len(all_issues)}")
+        return None
+
+    return response.json()
+
+def page_issues(project, offset, limit, updated_since, issue_queue, errors):
+    """
+    Pager thread: walk /issues.json pages and stream (page offset, issue id) into
+    issue_queue, so list requests run ahead of (and off the critical path of) the
+    detail workers. The bounded queue keeps it at most a few pages ahead.
+    Puts None when done, failures are appended to errors.
+    """
+    try:
+        while True:
+            data = fetch_issues_page(project, offset, limit, updated_since)
+            if data is None:
+                errors.append(f"Failed to fetch issues at offset {offset}")
+                break
+
+            issues = data.get('issues', [])
+            if not issues:
+                break
+
+            print(f"🔹 Retrieved {len(issues)} issues (offset {offset})")
+            for issue in issues:
+                issue_queue.put((offset, issue['id']))
+
+            # Redmine silently caps the page size to its server maximum, follow what it used
+            offset += data.get('limit') or len(issues)
+            if offset >= data.get('total_count', offset + 1):
+                break
+            time.sleep(0.5)  # Polite delay to avoid hammering the server
+    except Exception as ex:
+        errors.append(f"Failed to fetch issues at offset {offset}: {ex}")
+    finally:
+        issue_queue.put(None)
+
+# === Output writers (--format) ===
+# All of them are only used from the main thread, in issue order.
+
+class FilesWriter:
+    """ Default layout: issue_<id>.json and issue_<id>.txt per issue. """
+
+    def __init__(self, folder, append):
+        self.folder = folder
+
+    def write(self, full_data):
+        write_issue_files(self.folder, full_data.get('id'), full_data)
+
+    def close(self):
+        pass
+
+class JsonlWriter:
+    """
+    Gzip-compressed JSON Lines, one issue per line, streamed to disk.
+    A fresh export writes issues.jsonl.gz, incremental/resumed runs and retried
+    issues add a new issues.<timestamp>.jsonl.gz segment (readers keep the last
+    record of each issue). Issues must be written sorted by id, readers merge
+    the segments in id order.
+    """
+
+    def __init__(self, folder, append):
+        if not append:
+            for fname in os.listdir(folder):
+                if fname.startswith('issues') and fname.endswith('.jsonl.gz'):
+                    os.remove(os.path.join(folder, fname))
+            fname = 'issues.jsonl.gz'
+        else:
+            stamp = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+            fname = f"issues.{stamp}.jsonl.gz"
+            # Segments opened within the same second, '_' sorts after '.' so the newer one still wins
+            n = 1
+            while os.path.exists(os.path.join(folder, fname)):
+                fname = f"issues.{stamp}_{n}.jsonl.gz"
+                n += 1
+        self.path = os.path.join(folder, fname)
+        self.file = gzip.open(self.path, 'wt', encoding='utf-8')
+
+    def write(self, full_data):
+        self.file.write(json.dumps(full_data, ensure_ascii=False) + '\n')
+        # Sync flush, so everything covered by the checkpoint is readable after a crash
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class SqliteWriter:
+    """ Single SQLite database (issues.sqlite), indexed by issue id, updated_on and status. """
+
+    def __init__(self, folder, append):
+        self.path = os.path.join(folder, 'issues.sqlite')
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        if not append:
+            self.db.execute('DROP TABLE IF EXISTS issues')
+        self.db.execute('CREATE TABLE IF NOT EXISTS issues (id INTEGER PRIMARY KEY, updated_on TEXT, status TEXT, data TEXT NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS issues_updated_on ON issues (updated_on)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS issues_status ON issues (status)')
+        self.db.commit()
+
+    def write(self, full_data):
+        self.db.execute(
+            'INSERT OR REPLACE INTO issues (id, updated_on, status, data) VALUES (?, ?, ?, ?)',
+            (full_data.get('id'), full_data.get('updated_on'), full_data.get('status', {}).get('name'), json.dumps(full_data, ensure_ascii=False))
+        )
+        # Commit per issue, as the checkpoint is
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+WRITERS = {
+    'files': FilesWriter,
+    'jsonl': JsonlWriter,
+    'sqlite': SqliteWriter,
+}
+
+def write_issue_files(folder, issue_id, full_data):
+    json_path = os.path.join(folder, f'issue_{issue_id}.json')
+    txt_path = os.path.join(folder, f'issue_{issue_id}.txt')
+
+    # === Save JSON ===
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(full_data, f, indent=2)
+
+    # === Save as readable text ===
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write(issue_text(full_data))
+
+def download_attachments(folder, issue_id, attachments):
+    attachment_dir = os.path.join(folder, f'issue_{issue_id}_attachments')
+    os.makedirs(attachment_dir, exist_ok=True)
+
+    for att in attachments:
+        filename = att.get('filename')
+        content_url = att.get('content_url')
+        if not filename or not content_url:
+            continue
+
+        att_path = os.path.join(attachment_dir, filename)
+        if is_attachment_current(att_path, att):
+            # Attachments are immutable on Redmine, only new/changed ones need downloading
+            continue
+
+        print(f"   📎 Downloading attachment: {filename}")
+        if blob_store:
+            status = blob_store.fetch(content_url, att_path, filesize=att.get('filesize'), digest=att.get('digest'))
+        else:
+            status = download_file(session, content_url, att_path, filesize=att.get('filesize'), digest=att.get('digest'))
+        if status != 200:
+            print(f"   ⚠️ Failed to download attachment '{filename}': {status}")
+            raise Exception(f"Failed to download attachment '{filename}'")
+
+def export_issue(folder, issue_id):
+    """
+    Fetch full issue details and download its attachments.
+    Runs on worker threads, each issue only touches its own files. The issue
+    data itself is written by the caller, see WRITERS.
+    """
+    issue_url = f'{base_url}/issues/{issue_id}.json?include=journals,attachments,changesets'
+    detail_resp = session.get(issue_url)
+
+    if detail_resp.status_code != 200:
+        print(f"⚠️ Failed to get full data for issue #{issue_id}")
+        raise Exception(f"Failed to get issue #{issue_id}: {detail_resp.status_code}")
+
+    print(f"   📝 Processing issue #{issue_id}")
+
+    full_data = detail_resp.json().get('issue', {})
+
+    # === Download issue as PDF ===
+#    pdf_url = f'{base_url}/issues/{issue_id}.pdf'
+#    print(f"   📄 Downloading PDF for issue #{issue_id}")
+#    pdf_resp = session.get(pdf_url)
+#    if pdf_resp.status_code == 200:
+#        pdf_path = os.path.join(folder, f'issue_{issue_id}.pdf')
+#        with open(pdf_path, 'wb') as f:
+#            f.write(pdf_resp.content)
+#    else:
+#        print(f"   ⚠️ Failed to download PDF for issue #{issue_id}: {pdf_resp.status_code}")
+
+    # === Download attachments ===
+    attachments = full_data.get('attachments', [])
+    if attachments:
+        download_attachments(folder, issue_id, attachments)
+
+    return full_data
+
+def try_export_issue(folder, issue_id):
+    """ Like export_issue(), but returns None on failure instead of raising. """
+    try:
+        return export_issue(folder, issue_id)
+    except Exception as ex:
+        print(f"   ⚠️ Issue #{issue_id} failed, queued for retry: {ex}")
+        return None
+
+def drain_retry_queue(executor, folder, retry_queue):
+    """
+    Retry failed issues for up to retry_rounds rounds.
+    Returns (exported issues, ids still failing).
+    """
+    exported = []
+    for attempt in range(retry_rounds):
+        if not retry_queue:
+            break
+        print(f"\n🔄 Retrying {len(retry_queue)} failed issues (round {attempt + 1}/{retry_rounds})")
+        time.sleep(attempt * 5)
+        failed = []
+        for issue_id, full_data in zip(retry_queue, executor.map(try_export_issue, [folder] * len(retry_queue), retry_queue)):
+            if full_data is None:
+                failed.append(issue_id)
+            else:
+                exported.append(full_data)
+        retry_queue = failed
+    return exported, retry_queue
+
+
+def export_project(project, folder, executor, args):
+    """
+    Export all issues of a Redmine project into folder, using the shared executor.
+    Returns a summary dict (project, exported, failed, error).
+    """
+    os.makedirs(folder, exist_ok=True)
+    summary = {'project': project, 'exported': 0, 'failed': [], 'error': None}
+
+    offset = args.offset
+    updated_since = None
+
+    state = load_state(folder)
+    if args.incremental and state.get('updated_on'):
+        updated_since = state['updated_on']
+
+    checkpoint = {
+        'offset': offset,
+        'last_issue_id': 0,
+        'updated_since': updated_since,
+        'updated_on': state.get('updated_on', ''),
+        'failed': [],
+    }
+    if args.resume:
+        previous = load_checkpoint(folder)
+        if previous:
+            checkpoint.update(previous)
+            # Keep the same query as the interrupted run, and step back one page
+            # so issues deleted meanwhile cannot make us skip over unseen ones
+            updated_since = checkpoint['updated_since']
+            offset = max(0, checkpoint['offset'] - args.page_size)
+            print(f"⏯ Resuming export after issue #{checkpoint['last_issue_id']} (offset {offset}, {len(checkpoint['failed'])} queued for retry)")
+        else:
+            print("⚠️ No checkpoint found, starting from the beginning")
+
+    if updated_since:
+        print(f"🔁 Incremental export, fetching issues updated since {updated_since}")
+
+    print(f"\U0001F4E5 Starting to fetch issues from '{project}'")
+
+    # Incremental/resumed runs add to the previous output instead of replacing it
+    writer = WRITERS[args.format](folder, append=bool(updated_since or args.resume or offset))
+
+    # === Paginate through all issues (including closed) on a pager thread ===
+    issue_queue = queue.Queue(maxsize=args.workers * 4)
+    pager_errors = []
+    pager = threading.Thread(target=page_issues, args=(project, offset, args.page_size, updated_since, issue_queue, pager_errors), daemon=True)
+    pager.start()
+
+    def commit(page_offset, issue_id, future):
+        full_data = future.result()
+        if full_data is None:
+            checkpoint['failed'].append(issue_id)
+        else:
+            writer.write(full_data)
+            summary['exported'] += 1
+            # ISO-8601 UTC timestamps compare correctly as strings
+            if full_data.get('updated_on', '') > checkpoint['updated_on']:
+                checkpoint['updated_on'] = full_data['updated_on']
+        checkpoint['offset'] = page_offset
+        checkpoint['last_issue_id'] = issue_id
+        save_checkpoint(folder, checkpoint)
+
+    # Issues are committed in submission order, so output stays deterministic and
+    # the checkpoint always points to the last fully completed issue
+    pending = deque()
+    while True:
+        item = issue_queue.get()
+        if item is None:
+            break
+
+        page_offset, issue_id = item
+        # Issues are sorted by id, so on resume anything up to the checkpoint is done
+        if issue_id <= checkpoint['last_issue_id']:
+            continue
+
+        pending.append((page_offset, issue_id, executor.submit(try_export_issue, folder, issue_id)))
+        # Keep a bounded window of issues in flight
+        while len(pending) > args.workers * 2 or (pending and pending[0][2].done()):
+            commit(*pending.popleft())
+
+    while pending:
+        commit(*pending.popleft())
+
+    writer.close()
+
+    # === Retry failed issues, instead of aborting the whole export ===
+    exported, checkpoint['failed'] = drain_retry_queue(executor, folder, checkpoint['failed'])
+    if exported:
+        # Retried issues have lower ids than the ones already written, they go
+        # to a writer of their own so every jsonl segment stays sorted by id
+        writer = WRITERS[args.format](folder, append=True)
+        for full_data in sorted(exported, key=lambda issue: issue['id']):
+            writer.write(full_data)
+            summary['exported'] += 1
+            if full_data.get('updated_on', '') > checkpoint['updated_on']:
+                checkpoint['updated_on'] = full_data['updated_on']
+        writer.close()
+    summary['failed'] = checkpoint['failed']
+
+    if pager_errors:
+        # Keep the checkpoint, the rest of the issues were never listed
+        save_checkpoint(folder, checkpoint)
+        summary['error'] = pager_errors[0]
+        print(f"\n❌ {pager_errors[0]}")
+        print("   Run again with --resume to continue.")
+        return summary
+
+    if checkpoint['failed']:
+        # Keep the checkpoint, so a later --resume retries what is still failing
+        save_checkpoint(folder, checkpoint)
+        print(f"\n⚠️ Completed with {len(checkpoint['failed'])} failed issues: {checkpoint['failed']}")
+        print("   Run again with --resume to retry them.")
+        return summary
+
+    clear_checkpoint(folder)
+
+    # Only advance the watermark once the whole export has succeeded, a run
+    # started at a later offset may have missed updates on earlier issues
+    if args.offset == 0:
+        state['updated_on'] = checkpoint['updated_on']
+        save_state(folder, state)
+
+    print(f"\n✅ Completed '{project}'. Total issues downloaded: {summary['exported']}")
+    return summary
+
+
+# Parse arguments:
+#  --redmine-url => Redmine instance URL
+#  --redmine-token => Redmine API token
+#  --redmine-project => Redmine project identifier(s), comma-separated, or '*' for all projects visible to the key
+#  --output-dir => Output directory for issues (one subfolder per project when exporting several)
+#  --offset => Issue offset to start from (to resume a disrupted download)
+#  --workers => Number of issues fetched in parallel (shared by all projects)
+#  --page-size => Issues per /issues.json page (up to the Redmine server maximum)
+#  --incremental => Only fetch issues updated since the last successful export
+#  --resume => Continue an interrupted export from its checkpoint
+#  --format => Output format: files (default, .json/.txt per issue), jsonl (issues.jsonl.gz) or sqlite (issues.sqlite)
+#  --blob-store => Folder of a content-addressed attachment store (attachment folders link into it)
+#  --http-cache => Folder of an on-disk cache of Redmine API responses, revalidated with ETag/Last-Modified
+#  --http-cache-size => Maximum size of the HTTP cache in MB (least recently used responses are evicted)
+#  --offline => Replay responses from --http-cache only, without sending any request to Redmine
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='Export Redmine Issues with Metadata, Comments and Attachments')
+    parser.add_argument('--redmine-url', type=str, default=base_url, help='Base URL of the Redmine instance')
+    parser.add_argument('--redmine-token', type=str, default=api_key, help='Redmine API token')
+    parser.add_argument('--redmine-project', type=str, default=project_id, help="Redmine project identifier(s), comma-separated, or '*' for all projects visible to the key")
+    parser.add_argument('--output-dir', type=str, default=output_folder, help='Output directory for issues (one subfolder per project when exporting several)')
+    parser.add_argument('--offset', type=int, default=offset, help='Issue offset to start from (to resume a disrupted download)')
+    parser.add_argument('--workers', type=int, default=workers, help='Number of issues fetched in parallel (shared by all projects)')
+    parser.add_argument('--page-size', type=int, default=limit, help='Issues per /issues.json page (up to the Redmine server maximum)')
+    parser.add_argument('--incremental', action='store_true', help='Only fetch issues updated since the last successful export')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted export from its checkpoint')
+    parser.add_argument('--format', type=str, choices=sorted(WRITERS), default='files', help='Output format: files (.json/.txt per issue), jsonl (issues.jsonl.gz) or sqlite (issues.sqlite)')
+    parser.add_argument('--blob-store', type=str, help='Folder of a content-addressed attachment store (attachment folders link into it)')
+    parser.add_argument('--http-cache', type=str, help='Folder of an on-disk cache of Redmine API responses, revalidated with ETag/Last-Modified')
+    parser.add_argument('--http-cache-size', type=int, default=1024, help='Maximum size of the HTTP cache in MB (least recently used responses are evicted)')
+    parser.add_argument('--offline', action='store_true', help='Replay responses from --http-cache only, without sending any request to Redmine')
+    return parser.parse_args()
+
+def main():
+    global api_key, base_url, headers, session, blob_store
+    args = parse_args()
+
+    if args.offline and not args.http_cache:
+        print("❌ --offline replays responses from --http-cache, which must be given too.")
+        exit()
+
+    api_key = args.redmine_token
+    base_url = args.redmine_url.rstrip('/')
+    headers = {'X-Redmine-API-Key': api_key}
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Shared by all workers (and projects), so connections are kept alive and reused.
+    # One more connection for the pager thread, which fetches issue pages alongside the workers
+    session = create_session(headers, pool_size=args.workers + 1, cache_dir=args.http_cache, cache_max_size=args.http_cache_size * 1024 * 1024, offline=args.offline)
+
+    if args.blob_store:
+        blob_store = BlobStore(session, args.blob_store)
+
+    if args.redmine_project.strip() == '*':
+        projects = fetch_projects(session, base_url)
+        print(f"🔍 Found {len(projects)} projects visible to the API key")
+    else:
+        projects = [p.strip() for p in args.redmine_project.split(',') if p.strip()]
+
+    # A single project keeps the historical layout, several get one subfolder each
+    multi_project = len(projects) > 1
+
+    # One worker pool for all projects, --workers is a global concurrency limit
+    summaries = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for project in projects:
+            folder = os.path.join(args.output_dir, project) if multi_project else args.output_dir
+            summaries.append(export_project(project, folder, executor, args))
+
+    if multi_project:
+        print("\n📊 Summary:")
+        for summary in summaries:
+            status = '❌' if summary['error'] else ('⚠️' if summary['failed'] else '✅')
+            print(f" {status} {summary['project']}: {summary['exported']} issues exported, {len(summary['failed'])} failed" + (f" ({summary['error']})" if summary['error'] else ''))
+        print(f"\n✅ Completed. Total issues downloaded: {sum(s['exported'] for s in summaries)} from {len(summaries)} projects")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,125 @@
-import requests
 import os
 import re
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from requests.utils import quote
 from urllib.parse import urljoin
+import redmine_common
 
 # === Configuration ===
-PROJECT_ID = None  # Replace with your project identifier
+PROJECT_ID = None  # Replace with your project identifier(s), comma-separated, or '*' for all
 API_KEY = None  # Replace with your Redmine API key
 COOKIE = None  # Replace with your Redmine session cookie if needed
 BASE_URL = None  # e.g., 'https://redmine.example.com'
 HEADERS = None
+SESSION = None
+BLOB_STORE = None
 SKIP_PAGES = set()
+args = None
+
+# === Worker pools (pages, and their attachments/images), shared by all projects ===
+WORKERS = 8
+PAGE_EXECUTOR = None
+DOWNLOAD_EXECUTOR = None
+
+# === Page history archives (--history): <page>_history.zip with versions.json + v<N>.txt ===
+HISTORY_SUFFIX = '_history.zip'
+HISTORY_INDEX = 'versions.json'
+HISTORY_FAILED = 'failed_versions.json'  # versions that could not be fetched, retried on later runs
 
 # === Create output folder ===
 OUTPUTDIR = 'wiki_pages'
 
-def download_file(url, path):
+def download_file(url, path, attachment=None):
+    """ Download url into path (unless already there), returns True once path holds it. """
+    # Skip files already on disk matching the size/digest reported by Redmine
+    if attachment and redmine_common.is_attachment_current(path, attachment):
+        print(f"   ⏭ Up to date: {os.path.basename(path)}")
+        return True
+
     try:
-        resp = requests.get(url, headers=HEADERS)
-        if resp.status_code == 200:
-            with open(path, 'wb') as f:
-                f.write(resp.content)
-            print(f"   📎 Downloaded: {os.path.basename(path)}")
+        attachment = attachment or {}
+        if BLOB_STORE:
+            # Attachments also embedded as images are only downloaded once
+            status = BLOB_STORE.fetch(url, path, filesize=attachment.get('filesize'), digest=attachment.get('digest'))
         else:
-            print(f"   ⚠️ Failed to download {url} ({resp.status_code})")
-            if args.fail_fast:
-                exit()
+            status = redmine_common.download_file(SESSION, url, path, filesize=attachment.get('filesize'), digest=attachment.get('digest'))
+        if status == 200:
+            print(f"   📎 Downloaded: {os.path.basename(path)}")
+            return True
+        print(f"   ⚠️ Failed to download {url} ({status})")
+        if args.fail_fast:
+            exit()
     except Exception as ex:
         print(f"   ⚠️ Exception downloading {url}: {ex}")
         if args.fail_fast:
             exit()
+    return False
+
+def submit_download(downloads, url, path, attachment=None):
+    """ Queue download_file() on the download pool, collecting its future into downloads. """
+    downloads.append(DOWNLOAD_EXECUTOR.submit(download_file, url, path, attachment))
+
+# === Embedded references scanner ===
+# A single regex alternation, searched left to right, so page content is scanned once.
+# Every repetition is bounded and stops at the next '<' (tags) or '!' (Textile images),
+# so failed match attempts never rescan the same text and the scan stays linear in the
+# size of the page, whatever its content.
+WIKI_REF_RE = re.compile(r"""
+    <(?P<code>pre|code)\b[^<>]{0,1024}>
+  | <img\b(?P<img>[^<>]{0,4096}?)/?>
+  | (?<![\w!])!(?:\{[^}!\n]{0,256}\})?(?:\([^)!\n]{0,256}\))?[<>=]{0,2}(?P<textile>[^\s!(){}]{1,2048})(?:\([^)!\n]{0,1024}\))?!
+  | \battachment:(?:"(?P<att_q>[^"\n]{1,1024})"|(?P<att>[^\s<>"'\]|]{1,1024}))
+""", re.IGNORECASE | re.VERBOSE)
+
+# src attribute within the (bounded) attributes of an <img> tag
+IMG_SRC_RE = re.compile(r"""\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"']+))""", re.IGNORECASE)
+
+# End of the <pre>/<code> regions skipped by the scanner
+CODE_END_RE = {
+    'pre': re.compile(r'</pre\s*>', re.IGNORECASE),
+    'code': re.compile(r'</code\s*>', re.IGNORECASE),
+}
+
+def scan_wiki_refs(content):
+    """
+    Scan page content once, returning the (kind, reference) pairs found outside <pre> and
+    <code> regions, in order. kind is 'textile' (!{style}image(title)!) or 'html' (<img src>)
+    for embedded images, and 'attachment' for attachment:name links.
+    """
+    refs = []
+    pos = 0
+    while True:
+        m = WIKI_REF_RE.search(content, pos)
+        if not m:
+            break
+        pos = m.end()
+        if m.group('code'):
+            # Jump over the whole code region (up to the end of the page if left open)
+            end = CODE_END_RE[m.group('code').lower()].search(content, pos)
+            pos = end.end() if end else len(content)
+        elif m.group('textile'):
+            refs.append(('textile', m.group('textile')))
+        elif m.group('att_q') or m.group('att'):
+            refs.append(('attachment', m.group('att_q') or m.group('att').rstrip('.,:;!?)')))
+        else:
+            src = IMG_SRC_RE.search(m.group('img'))
+            if src:
+                refs.append(('html', next(g for g in src.groups() if g is not None)))
+    return refs
+
+def download_embedded_images(content, attachments, img_folder, downloads):
+    # Find embedded images in Textile or HTML, not within <pre>/<code> blocks
+    refs = scan_wiki_refs(content)
+    all_imgs = set(ref for kind, ref in refs if kind != 'attachment')
+
+    # attachment:name links to files missing from the page would be left dangling
+    attachment_names = set(att['filename'].lower() for att in attachments)
+    for name in set(ref for kind, ref in refs if kind == 'attachment'):
+        if name.lower() not in attachment_names:
+            print(f"   ⚠️ Link to missing attachment '{name}'.")
 
-def download_embedded_images(content, attachments, img_folder):
-    # Find embedded images in Textile or HTML, not within <code>..</code> blocks
-    textile_imgs = re.findall(r'!(?:\{[^\}]*\})?(^!\s+\.\s+)(?:\([^\)]*\))?!', content)
-    #textile_imgs = re.findall(r'!(.+?)!', content)
-    # Remove styling parameters nside the image reference (ie, remove anything between {})
-    textile_imgs = [s.split("}", 1)[-1] for s in textile_imgs]
-    # Remove optional title after the image URL (ie, remove anything after a parenthesis)
-    textile_imgs = [s.split("(", 1)[0] for s in textile_imgs]
-    html_imgs = re.findall(r'<img [^>]*src=[\'"]([^\'"]+)[\'"]', content)
-    all_imgs = set(textile_imgs + html_imgs)
     if not all_imgs:
         return
 
@@ -51,10 +130,13 @@ def download_embedded_images(content, attachments, img_folder):
     attachment_lookup_lower = {att['filename'].lower(): att for att in attachments}
 
     for img in all_imgs:
+        attachment = None
         if img in attachment_lookup:
-            img_url = attachment_lookup[img]['content_url']
+            attachment = attachment_lookup[img]
+            img_url = attachment['content_url']
         elif img.lower() in attachment_lookup_lower:
-            img_url = attachment_lookup_lower[img.lower()]['content_url']
+            attachment = attachment_lookup_lower[img.lower()]
+            img_url = attachment['content_url']
         elif img.startswith('http://') or img.startswith('https://'):
             img_url = img
         elif img.startswith('/'):
@@ -70,19 +152,166 @@ def download_embedded_images(content, attachments, img_folder):
 
         img_filename = os.path.basename(img.split('?')[0])
         img_path = os.path.join(img_folder, img_filename)
-        download_file(img_url, img_path)
+        submit_download(downloads, img_url, img_path, attachment)
+
+def safe_filename(title):
+    # Sanitize filename
+    return re.sub(r'[<>:\"/\\|?*]', '_', title)
+
+def local_page_version(outdir, title):
+    """ Return (version, updated_on, parent title) of the page as last exported into outdir, or None. """
+    json_file_path = os.path.join(outdir, f"{safe_filename(title)}.json")
+    if not os.path.exists(json_file_path):
+        return None
+    try:
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            page_data = json.load(f).get('wiki_page', {})
+    except Exception:
+        return None
+    return (page_data.get('version'), page_data.get('updated_on'), page_data.get('parent', {}).get('title'))
+
+def history_entry(page_data):
+    """ Keep the fields of a page version stored in its history archive. """
+    return {
+        'version': page_data.get('version'),
+        'author': page_data.get('author', {}).get('name', 'Unknown'),
+        'updated_on': page_data.get('updated_on'),
+        'comments': page_data.get('comments', ''),
+        'text': page_data.get('text', ''),
+    }
+
+def fetch_page_version(project, title, version):
+    """
+    Fetch one version of a wiki page, as a history entry. Returns None for versions
+    deleted from the page history, raises if the version could not be fetched.
+    """
+    url = f'{BASE_URL}/projects/{project}/wiki/{quote(title, safe="")}/{version}.json'
+    response = SESSION.get(url)
+    if response.status_code == 404:
+        # Versions can be deleted from a page history
+        return None
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code}")
+    return history_entry(response.json().get('wiki_page', {}))
+
+def load_history(path):
+    """
+    Read the versions stored in an existing history archive, as ({version: entry}, failed),
+    where failed is the set of versions a previous run could not fetch.
+    """
+    history = {}
+    failed = set()
+    if not os.path.exists(path):
+        return (history, failed)
+    try:
+        with zipfile.ZipFile(path) as zf:
+            for entry in json.loads(zf.read(HISTORY_INDEX)):
+                entry['text'] = zf.read(entry.pop('file')).decode('utf-8')
+                history[entry['version']] = entry
+            if HISTORY_FAILED in zf.namelist():
+                failed = set(json.loads(zf.read(HISTORY_FAILED)))
+    except Exception as e:
+        print(f"   ⚠️ Could not read history archive '{path}': {str(e)}, rebuilding it.")
+        return ({}, set())
+    return (history, failed)
+
+def history_complete(path):
+    """ True when the history archive exists, and has no versions left to retry. """
+    if not os.path.exists(path):
+        return False
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return HISTORY_FAILED not in zf.namelist()
+    except Exception:
+        return False
+
+def write_history(path, history, failed=()):
+    """
+    Write history ({version: entry}) as a zip archive holding versions.json and one
+    v<N>.txt per version, where consecutive versions with identical text share a file.
+    Versions that could not be fetched are listed in failed_versions.json.
+    """
+    entries = []
+    tmp_path = path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        text_file, text = None, None
+        for version in sorted(history):
+            entry = dict(history[version])
+            if text_file is None or entry['text'] != text:
+                text_file, text = f"v{version}.txt", entry['text']
+                zf.writestr(text_file, text)
+            del entry['text']
+            entry['file'] = text_file
+            entries.append(entry)
+        zf.writestr(HISTORY_INDEX, json.dumps(entries, indent=2, ensure_ascii=False))
+        if failed:
+            zf.writestr(HISTORY_FAILED, json.dumps(sorted(failed)))
+    os.replace(tmp_path, path)
+
+def export_page_history(project, outdir, title, page_data):
+    """
+    Save all versions of a page into <page>_history.zip. Versions already in the
+    archive (from a previous run) are kept, and only the missing ones are fetched,
+    in parallel on the download pool. Versions that fail to download are recorded
+    in the archive and fetched again by the next run.
+    """
+    latest = page_data.get('version')
+    if not isinstance(latest, int):
+        return
 
-def fetch_pages_list():
+    path = os.path.join(outdir, safe_filename(title) + HISTORY_SUFFIX)
+    history, failed = load_history(path)
+    if latest in history:
+        if not failed:
+            return
+        # Only retry what failed (versions missing otherwise were deleted)
+        missing = sorted(failed)
+    else:
+        history[latest] = history_entry(page_data)
+        missing = [v for v in range(1, latest) if v not in history]
+
+    failed = set()
+    futures = {v: DOWNLOAD_EXECUTOR.submit(fetch_page_version, project, title, v) for v in missing}
+    for version, future in futures.items():
+        try:
+            entry = future.result()
+        except Exception as e:
+            print(f"   ⚠️ Failed to fetch version {version} of page '{title}': {str(e)}")
+            if args.fail_fast:
+                exit()
+            failed.add(version)
+            continue
+        if entry is not None:
+            history[version] = entry
+
+    write_history(path, history, failed)
+    print(f"   🕘 Saved {len(history)} versions of '{title}' into {os.path.basename(path)}")
+    if failed:
+        print(f"   ⚠️ {len(failed)} versions of '{title}' could not be fetched, they will be retried on the next run.")
+
+# NOTE: Redmine's whole-wiki export (/projects/<id>/wiki/export) is not used to save the
+# per-page requests: it only returns pages rendered to HTML (or PDF), while we need the
+# Textile source (converted by the importers) plus author/comments/attachments, which
+# only the per-page .json carries. On high-latency links, raise --workers instead (page
+# requests overlap and share keep-alive connections) and use --incremental on re-runs.
+def fetch_pages_list(project):
+    """
+    Fetch the wiki index, as a list of dicts with the page 'title', plus 'version',
+    'updated_on' and 'parent' title when available (from the API, not from the HTML fallback).
+    """
     # try first fetching wiki list from API
-    api_url = f'{BASE_URL}/projects/{PROJECT_ID}/wiki/index.json'
-    response = requests.get(api_url, headers=HEADERS)
+    api_url = f'{BASE_URL}/projects/{project}/wiki/index.json'
+    response = SESSION.get(api_url)
 
     print(f"🔍 Fetching wiki pages list from {api_url}...")
 
     if response.status_code == 200:
         try:
             data = response.json()
-            wiki_pages = [page['title'] for page in data.get('wiki_pages', [])]
+            wiki_pages = [
+                {'title': page['title'], 'version': page.get('version'), 'updated_on': page.get('updated_on'), 'parent': page.get('parent', {}).get('title')}
+                for page in data.get('wiki_pages', [])
+            ]
             return wiki_pages
         except Exception as e:
             print(f"⚠️ Could not parse JSON from API wiki index: {str(e)}, retrying with HTML parsing.")
@@ -91,91 +320,31 @@ def fetch_pages_list():
 
     # fecht the list of wiki pages, from the html view, 
     # by extracting wiki names using reges
-    response = requests.get(f'{BASE_URL}/projects/{PROJECT_ID}/wiki/index', headers=HEADERS)
+    response = SESSION.get(f'{BASE_URL}/projects/{project}/wiki/index')
 
     if response.status_code != 200:
         print(f"❌ Failed to fetch wiki index: {response.status_code}")
         print(response.text)
-        exit()
-
-    wiki_pages = re.findall(r'/projects/' + re.escape(PROJECT_ID) + r'/wiki/([^"\'>]+)"', response.text)
-    return wiki_pages
-
-
-# Parse arguments:
-#  --redmine-url => Redmine instance URL
-#  --redmine-user => Redmine user email
-#  --redmine-token => Redmine API token
-#  --redmine-cookie => Redmine session cookie
-#  --redmine-project => Redmine project key
-#  --output-dir => Output directory for wiki pages
-#  --fail-fast => Fail fast on errors
-#  --skip-pages => Comma-separated list of wiki pages to skip
-def parse_args():
-    import argparse
-    parser = argparse.ArgumentParser(description='Export Redmine Wiki Pages with Metadata and Attachments')
-    parser.add_argument('--redmine-url', type=str, required=True, help='Base URL of the Redmine instance')
-    parser.add_argument('--redmine-token', type=str, help='Redmine API token')
-    parser.add_argument('--redmine-cookie', type=str, help='Redmine session cookie')
-    parser.add_argument('--redmine-project', type=str, required=True, help='Redmine project identifier')
-    parser.add_argument('--output-dir', type=str, default='wiki_pages', help='Output directory for wiki pages')
-    parser.add_argument('--fail-fast', action='store_true', help='Fail fast on errors')
-    parser.add_argument('--skip-pages', type=str, help='Comma-separated list of wiki pages to skip')
-    return parser.parse_args()
-
-args = parse_args()
-OUTPUTDIR = args.output_dir
-BASE_URL = args.redmine_url.rstrip('/')
-API_KEY = args.redmine_token
-COOKIE = args.redmine_cookie
-PROJECT_ID = args.redmine_project
-
-if (not API_KEY) and (not COOKIE):
-    print("❌ You must provide either an API token or a session cookie for authentication.")
-    exit()
-
-if COOKIE:
-    HEADERS = {'Cookie': f"_redmine_session={COOKIE}"}
-else:
-    HEADERS = {'X-Redmine-API-Key': API_KEY}
-
-if args.skip_pages:
-    SKIP_PAGES = set([p.strip() for p in args.skip_pages.split(',') if p.strip()])
-
-os.makedirs(OUTPUTDIR, exist_ok=True)
-
-print(f"🚀 Starting export of wiki pages from project '{PROJECT_ID}' at '{BASE_URL}'...\n")
-
-# === Step 1: Get the list of wiki pages ===
-wiki_pages = fetch_pages_list()
-print(f"📄 Found {len(wiki_pages)} wiki pages.")
-# pretty print the list of pages
-print("Pages:")
-for page in wiki_pages:
-    print(f" - {page}")
-
-#raise SystemExit
+        return None
 
-# === Step 2: Download each wiki page and metadata ===
-for page in wiki_pages:
-    title = page
+    wiki_pages = re.findall(r'/projects/' + re.escape(project) + r'/wiki/([^"\'>]+)"', response.text)
+    return [{'title': title} for title in wiki_pages]
 
-    if title in SKIP_PAGES:
-        print(f"⏭ Skipping page: {title}")
-        continue
 
+def export_page(project, outdir, title):
+    """ Download a wiki page with its metadata, attachments and embedded images. Returns True on success. """
     print(f"⬇ Downloading: {title}")
 
     # URL-encode the title for the request
     safe_title_for_url = quote(title, safe='')
-    page_url = f'{BASE_URL}/projects/{PROJECT_ID}/wiki/{safe_title_for_url}.json?include=attachments'
-    page_response = requests.get(page_url, headers=HEADERS)
+    page_url = f'{BASE_URL}/projects/{project}/wiki/{safe_title_for_url}.json?include=attachments'
+    page_response = SESSION.get(page_url)
 
     if page_response.status_code != 200:
         print(f"⚠️ Failed to fetch page '{title}': {page_response.status_code}")
         if args.fail_fast:
             exit()
-        continue
+        return False
 
     try:
         page_data = page_response.json().get('wiki_page', {})
@@ -184,7 +353,7 @@ for page in wiki_pages:
         print("Response text was:", page_response.text[:300])
         if args.fail_fast:
             exit()
-        continue
+        return False
 
     # Metadata fields
     content = page_data.get('text', '')
@@ -196,14 +365,9 @@ for page in wiki_pages:
     parent = page_data.get('parent', {}).get('title', 'None')
     attachments = page_data.get('attachments', [])
 
-    # Sanitize filename
-    safe_title = re.sub(r'[<>:\"/\\|?*]', '_', title)
-    json_file_path = os.path.join(OUTPUTDIR, f"{safe_title}.json")
-    page_file_path = os.path.join(OUTPUTDIR, f"{safe_title}.txt")
-
-    # Write raw JSON
-    with open(json_file_path, 'w', encoding='utf-8') as f:
-        f.write(page_response.text)
+    safe_title = safe_filename(title)
+    json_file_path = os.path.join(outdir, f"{safe_title}.json")
+    page_file_path = os.path.join(outdir, f"{safe_title}.txt")
 
     # Write metadata + content
     with open(page_file_path, 'w', encoding='utf-8') as f:
@@ -218,9 +382,10 @@ for page in wiki_pages:
         f.write("\n---\n\n")
         f.write(content)
 
-    # === Download attachments (if any) ===
+    # === Download attachments (if any), in parallel on the download pool ===
+    downloads = []
     if attachments:
-        attachment_folder = os.path.join(OUTPUTDIR, f"{safe_title}_attachments")
+        attachment_folder = os.path.join(outdir, f"{safe_title}_attachments")
         os.makedirs(attachment_folder, exist_ok=True)
         for att in attachments:
             filename = att.get('filename')
@@ -228,10 +393,186 @@ for page in wiki_pages:
             if not content_url or not filename:
                 continue
             file_path = os.path.join(attachment_folder, filename)
-            download_file(content_url, file_path)
+            submit_download(downloads, content_url, file_path, att)
 
     # === Download embedded images ===
-    img_folder = os.path.join(OUTPUTDIR, f"{safe_title}_images")
-    download_embedded_images(content, attachments, img_folder)
+    img_folder = os.path.join(outdir, f"{safe_title}_images")
+    download_embedded_images(content, attachments, img_folder, downloads)
+
+    # The page is done once all its files are (re-raises a --fail-fast exit)
+    downloaded = [future.result() for future in downloads]
+
+    if args.history:
+        export_page_history(project, outdir, title, page_data)
+
+    # Raw JSON goes last: --incremental takes the page as current once it is there
+    if not all(downloaded):
+        print(f"⚠️ Some files of page '{title}' could not be downloaded, it will be exported again on the next run.")
+        if os.path.exists(json_file_path):
+            os.remove(json_file_path)
+        return False
+    with open(json_file_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(page_response.text)
+    os.replace(json_file_path + '.tmp', json_file_path)
+
+    return True
+
+def export_wiki(project, outdir):
+    """ Export all wiki pages of a project into outdir. Returns a summary dict (project, pages, exported, error). """
+    summary = {'project': project, 'pages': 0, 'exported': 0, 'unchanged': 0, 'error': None}
+    os.makedirs(outdir, exist_ok=True)
+
+    print(f"🚀 Starting export of wiki pages from project '{project}' at '{BASE_URL}'...\n")
+
+    # === Step 1: Get the list of wiki pages ===
+    wiki_pages = fetch_pages_list(project)
+    if wiki_pages is None:
+        summary['error'] = 'Failed to fetch wiki index'
+        if args.fail_fast:
+            exit()
+        return summary
+
+    summary['pages'] = len(wiki_pages)
+    print(f"📄 Found {len(wiki_pages)} wiki pages.")
+    # pretty print the list of pages
+    print("Pages:")
+    for page in wiki_pages:
+        print(f" - {page['title']}")
+
+    # === Step 2: Download each wiki page and metadata, in parallel on the page pool ===
+    futures = []
+    for page in wiki_pages:
+        title = page['title']
+
+        if title in SKIP_PAGES:
+            print(f"⏭ Skipping page: {title}")
+            continue
+
+        # Pages whose version did not change since the last export are left as they are
+        # (unless --history was not used on that export, or some versions could not be fetched).
+        # Moving a page under another parent does not bump its version, so compare the parent too
+        history_missing = args.history and not history_complete(os.path.join(outdir, safe_filename(title) + HISTORY_SUFFIX))
+        if args.incremental and page.get('version') is not None and not history_missing:
+            if local_page_version(outdir, title) == (page['version'], page.get('updated_on'), page.get('parent')):
+                summary['unchanged'] += 1
+                continue
+
+        futures.append(PAGE_EXECUTOR.submit(export_page, project, outdir, title))
+
+    try:
+        for future in futures:
+            if future.result():
+                summary['exported'] += 1
+    except BaseException:
+        # --fail-fast exit() (or Ctrl-C): drop queued work instead of finishing it
+        PAGE_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        DOWNLOAD_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    if summary['unchanged']:
+        print(f"⏭ {summary['unchanged']} pages unchanged since last export.")
+
+    print(f"\n✅ Finished downloading {len(wiki_pages) - summary['unchanged']} wiki pages into '{outdir}' folder (including embedded images and all attachments).")
+    return summary
+
+
+# Parse arguments:
+#  --redmine-url => Redmine instance URL
+#  --redmine-user => Redmine user email
+#  --redmine-token => Redmine API token
+#  --redmine-cookie => Redmine session cookie
+#  --redmine-project => Redmine project key(s), comma-separated, or '*' for all projects visible to the credentials
+#  --output-dir => Output directory for wiki pages (one subfolder per project when exporting several)
+#  --fail-fast => Fail fast on errors
+#  --skip-pages => Comma-separated list of wiki pages to skip
+#  --blob-store => Folder of a content-addressed attachment store (attachment/image folders link into it)
+#  --workers => Number of pages (and of attachments/images) downloaded in parallel
+#  --incremental => Only download pages whose version changed since the last export (and new attachments)
+#  --history => Also export all versions of each page, into a <page>_history.zip archive
+#  --http-cache => Folder of an on-disk cache of Redmine API responses, revalidated with ETag/Last-Modified
+#  --http-cache-size => Maximum size of the HTTP cache in MB (least recently used responses are evicted)
+#  --offline => Replay responses from --http-cache only, without sending any request to Redmine
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description='Export Redmine Wiki Pages with Metadata and Attachments')
+    parser.add_argument('--redmine-url', type=str, required=True, help='Base URL of the Redmine instance')
+    parser.add_argument('--redmine-token', type=str, help='Redmine API token')
+    parser.add_argument('--redmine-cookie', type=str, help='Redmine session cookie')
+    parser.add_argument('--redmine-project', type=str, required=True, help="Redmine project identifier(s), comma-separated, or '*' for all projects visible to the credentials")
+    parser.add_argument('--output-dir', type=str, default='wiki_pages', help='Output directory for wiki pages (one subfolder per project when exporting several)')
+    parser.add_argument('--fail-fast', action='store_true', help='Fail fast on errors')
+    parser.add_argument('--skip-pages', type=str, help='Comma-separated list of wiki pages to skip')
+    parser.add_argument('--blob-store', type=str, help='Folder of a content-addressed attachment store (attachment/image folders link into it)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Number of pages (and of attachments/images) downloaded in parallel')
+    parser.add_argument('--incremental', action='store_true', help='Only download pages whose version changed since the last export (and new attachments)')
+    parser.add_argument('--history', action='store_true', help='Also export all versions of each page, into a <page>_history.zip archive')
+    parser.add_argument('--http-cache', type=str, help='Folder of an on-disk cache of Redmine API responses, revalidated with ETag/Last-Modified')
+    parser.add_argument('--http-cache-size', type=int, default=1024, help='Maximum size of the HTTP cache in MB (least recently used responses are evicted)')
+    parser.add_argument('--offline', action='store_true', help='Replay responses from --http-cache only, without sending any request to Redmine')
+    return parser.parse_args()
+
+def main():
+    global args, OUTPUTDIR, BASE_URL, API_KEY, COOKIE, PROJECT_ID, HEADERS, SESSION, BLOB_STORE, SKIP_PAGES
+    global PAGE_EXECUTOR, DOWNLOAD_EXECUTOR
+    args = parse_args()
+    OUTPUTDIR = args.output_dir
+    BASE_URL = args.redmine_url.rstrip('/')
+    API_KEY = args.redmine_token
+    COOKIE = args.redmine_cookie
+    PROJECT_ID = args.redmine_project
+
+    if (not API_KEY) and (not COOKIE):
+        print("❌ You must provide either an API token or a session cookie for authentication.")
+        exit()
+
+    if COOKIE:
+        HEADERS = {'Cookie': f"_redmine_session={COOKIE}"}
+    else:
+        HEADERS = {'X-Redmine-API-Key': API_KEY}
+
+    if args.offline and not args.http_cache:
+        print("❌ --offline replays responses from --http-cache, which must be given too.")
+        exit()
+
+    # Shared by all projects, so connections are kept alive and reused
+    SESSION = redmine_common.create_session(HEADERS, pool_size=args.workers * 2, cache_dir=args.http_cache, cache_max_size=args.http_cache_size * 1024 * 1024, offline=args.offline)
+
+    # Page workers wait on their downloads, so those get a pool of their own
+    PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=args.workers)
+    DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=args.workers)
+
+    if args.blob_store:
+        BLOB_STORE = redmine_common.BlobStore(SESSION, args.blob_store)
+
+    if args.skip_pages:
+        SKIP_PAGES = set([p.strip() for p in args.skip_pages.split(',') if p.strip()])
+
+    os.makedirs(OUTPUTDIR, exist_ok=True)
+
+    if PROJECT_ID.strip() == '*':
+        projects = redmine_common.fetch_projects(SESSION, BASE_URL)
+        print(f"🔍 Found {len(projects)} projects visible to the credentials")
+    else:
+        projects = [p.strip() for p in PROJECT_ID.split(',') if p.strip()]
+
+    # A single project keeps the historical layout, several get one subfolder each
+    multi_project = len(projects) > 1
+
+    summaries = []
+    for project in projects:
+        outdir = os.path.join(OUTPUTDIR, project) if multi_project else OUTPUTDIR
+        summaries.append(export_wiki(project, outdir))
+
+    PAGE_EXECUTOR.shutdown()
+    DOWNLOAD_EXECUTOR.shutdown()
+
+    if multi_project:
+        print("\n📊 Summary:")
+        for summary in summaries:
+            status = '❌' if summary['error'] else ('⚠️' if summary['exported'] + summary['unchanged'] < summary['pages'] else '✅')
+            print(f" {status} {summary['project']}: {summary['exported']}/{summary['pages']} pages exported, {summary['unchanged']} unchanged" + (f" ({summary['error']})" if summary['error'] else ''))
+        print(f"\n✅ Finished downloading {sum(s['exported'] for s in summaries)} wiki pages from {len(summaries)} projects into '{OUTPUTDIR}'.")
+
 
-print(f"\n✅ Finished downloading {len(wiki_pages)} wiki pages into '{OUTPUTDIR}' folder (including embedded images and all attachments).")
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,28 @@
 import os
 import re
+import json
 import subprocess
 import requests
 import textile
 import uuid
+import shutil
+import hashlib
+import threading
+import tempfile
+import multiprocessing.util
 import html as html_stdlib
 from pprint import pprint
 from atlassian import Confluence
 from bs4 import BeautifulSoup
-from bs4.element import CData
+from bs4.element import CData, NavigableString, Tag
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from time import sleep
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import pandoc_engine
+import conversion_cache
+import bs4
 
 # === Confluence configuration ===
 CONFLUENCE_URL = None
@@ -20,18 +33,61 @@ CONFLUENCE_SPACE_KEY = None
 CONFLUENCE_PARENT_FOLDER = None
 CONFLUENCE_PAGE_ROOT = None
 CONFLUENCE_OVERWRITE_EXISTING = []
+CONFLUENCE_OVERWRITE_MODE = 'update'  # or 'recreate' (delete+create)
 CONFLUENCE_TITLE_SUFFIX = "Legacy"
 REDMINE_ORIGIN_URL = None
 PAGES = None
 FAIL_FAST = False
+CONCURRENCY = 4  # pages created in parallel
+
+# === Attachment uploads (see upload_attachments_to_page) ===
+ATTACHMENT_BATCH_SIZE = 20  # files per multipart request
+ATTACHMENT_BATCH_BYTES = 50 * 1024 * 1024  # bytes per multipart request (a bigger file goes alone)
+ATTACHMENT_WORKERS = 8  # multipart requests sent in parallel, for all pages
+ATTACHMENT_HASH_PREFIX = 'sha256:'  # attachment comment recording the file hash
+UPLOAD_EXECUTOR = None
+
+# === PlantUML renders, cached by hash of the normalized diagram code (under wiki_dir) ===
+PLANTUML_CACHE_FOLDER = '.plantuml_cache'
+PLANTUML_BATCH_SIZE = 200  # diagrams per plantuml run (one JVM start each)
+PLANTUML_WORKERS = 4  # parallel 'plantuml -pipe' runs, for diagrams a batch run did not render
+
+# === HTML parser used by html_to_storage ('html.parser', or 'lxml' if installed) ===
+HTML_PARSER = 'html.parser'
 
 # === Local wiki export location ===
 wiki_dir = None
 
+# === Output of --compile-only (storage format pages + manifest), under wiki_dir by default ===
+COMPILE_FOLDER = '.compiled'
+COMPILE_MANIFEST = 'manifest.json'
+COMPILE_WORKERS = None  # conversion processes (None: one per CPU)
+
+# === Pages converted ahead of the ones created, at most (bounds memory and disk use of the pipeline) ===
+PIPELINE_WINDOW = 64
+
+# === Cache of conversion stage outputs (see convert_page_body), under wiki_dir ===
+CONVERSION_CACHE = None
+STAGE_FINGERPRINTS = {}
+
 # === Connect to Confluence ===
 confluence = None
+
+# === Pages already in the target space, by title (see PageIndex) ===
+PAGE_INDEX = None
 auth = None
 
+# === Content property holding the hash of the body last sent to a page (see overwrite_page) ===
+BODY_HASH_PROPERTY = 'redmine-import-body-hash'
+
+# === Storage format parts ignored when hashing page bodies (see storage_hash) ===
+STORAGE_VOLATILE_RE = re.compile(r'(key="local-id">)[^<]*|\s(?:ac:macro-id|ac:local-id|ac:schema-version|local-id)="[^"]*"')
+
+# === Retries of rate limited (429) or unavailable (503) Confluence requests ===
+RETRY_STATUS = (429, 503)
+RETRY_ATTEMPTS = 6
+RETRY_BACKOFF = 2  # seconds, doubled on every attempt, when the response has no Retry-After
+
 # === JSON Request Headers ===
 JSON_HEADERS = {
     "Accept": "application/json",
@@ -45,12 +101,7 @@ def textile_to_html(textile_text):
     version and replace unconverted tables with their equivalent from python-textile.
     Otherwise, just return the pandoc version.
     """
-    proc = subprocess.run(
-        ['pandoc', '--from=textile', '--to=html5', '--wrap=none'],
-        input=textile_text.encode('utf-8'),
-        stdout=subprocess.PIPE
-    )
-    presult = proc.stdout.decode('utf-8')
+    presult = pandoc_engine.convert(textile_text, 'textile', 'html5', wrap='none')
     psoup = BeautifulSoup(presult, 'html.parser')
 
     return presult # Skip textile fallback for now
@@ -76,138 +127,22 @@ def textile_to_html(textile_text):
 
     return presult
 
-def html_replace_img_with_confluence_macro(html, attachments):
-    # Only replace images that match an attachment
-    filenames = {os.path.basename(f) for f in attachments}
-    def replacer(match):
-        fname = match.group(1)
-        if fname in filenames:
-            return f'<ac:image><ri:attachment ri:filename="{fname}"/><ac:alt>{fname}</ac:alt></ac:image>'
-        else:
-            return match.group(0)
-    return re.sub(r'<img[^>]+src=[\'"]([^\'"]+)[\'"][^>]*>', replacer, html)
-
 RE_HEAD_PREFIX = re.compile(r'^\d+\.')
 
-def html_convert_links(html):
-    """
-    Make links clicable, convert links from redmine style to confluence style
-    If link points to original redmine, and is a wiki (/projects/../wiki/...) link,
-    convert it to a confluence page link.
-    If link points to original redmine, and is an issue (/issues/...) link,
-    convert it to jira issue link / search (by RedmineID).
-    """
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Find text like '[[Page Name]]' and '[[Page Name|Link Text]]' and convert to confluence links
-    pattern = re.compile(r'\[\[([^\|\]]+)(\|([^\]]+))?\]\]')
-    for text_node in soup.find_all(string=pattern):
-        new_content = text_node
-        for match in pattern.finditer(text_node):
-            page_name = match.group(1).strip().rstrip(':').replace('/', '').replace(' ', '_')
-            link_text = match.group(3).strip() if match.group(3) else page_name
-            link_text = link_text.replace('[', '(').replace(']', ')')
+# '[[Page Name]]' and '[[Page Name|Link Text]]' redmine wiki links
+WIKI_LINK_RE = re.compile(r'\[\[([^\|\]]+)(\|([^\]]+))?\]\]')
 
-            if RE_HEAD_PREFIX.match(page_name):
-                page_name = page_name.lstrip('0123456789.').strip()
+# Bare http(s) links, made clickable
+URL_RE = re.compile(r'https?://[^\s<>"\')]+')
 
-            confluence_link = (
-                f'<ac:link>'
-                    f'<ri:page ri:content-title="{page_name} ({CONFLUENCE_TITLE_SUFFIX})"/>'
-                    f'<ac:plain-text-link-body><![CDATA[{link_text}]]></ac:plain-text-link-body>'
-                f'</ac:link>'
-            )
-            new_content = new_content.replace(match.group(0), confluence_link)
-        new_soup = BeautifulSoup(new_content, 'html.parser')
-        text_node.replace_with(new_soup)
- 
-    for a in soup.find_all('a', href=True):
-        # If a-href is under a <code>, <pre> or <notextile>, ignore it..
-        parent_tags = [parent.name for parent in a.parents]
-        if 'code' in parent_tags or 'pre' in parent_tags or 'notextile' in parent_tags:
-            continue
-
-        href = a['href']
-        if REDMINE_ORIGIN_URL and href.startswith(REDMINE_ORIGIN_URL):
-            rel_link = href.replace(REDMINE_ORIGIN_URL, '')
-            if rel_link.startswith('/projects/') and '/wiki/' in rel_link:
-                # Replace '<a href="...">...</a>' with confluence <ac:link> macro
-                page_name = rel_link.split('/wiki/')[-1].strip().rstrip(':').replace('/', '').replace(' ', '_')
-                #page_name = page_name.replace(' ', '+').replace('_', '+')
-                link_name = page_name.replace('[', '(').replace(']', ')')
-                html = (
-                    f'<ac:link>'
-                        f'<ri:page ri:content-title="{page_name} ({CONFLUENCE_TITLE_SUFFIX})"/>'
-                        f'<ac:plain-text-link-body><![CDATA[{link_name}]]></ac:plain-text-link-body>'
-                    f'</ac:link>'
-                )
-                a.replace_with(BeautifulSoup(html, 'html.parser'))
-            elif '/issues/' in rel_link:
-                # Issue link
-                issue_id = rel_link.split('/issues/')[-1].split('/')[0]
-                jira_search_link = f"{CONFLUENCE_URL}/issues/?jql=\"RedmineID:{issue_id}\""
-                a['href'] = jira_search_link
-
-    # Find http links and make sure they are clickable
-    url_pattern = re.compile(
-        #r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        r'https?://[^\s<>"\')]+'
-    )
-    for url in soup.find_all(string=url_pattern):
-        # Skip nodes inside tags where we must not touch content (prevents self-linking loops)
-        parent_tags = [parent.name for parent in url.parents]
-        if 'a' in parent_tags or 'code' in parent_tags or 'pre' in parent_tags or 'notextile' in parent_tags:
-            continue
+# Redmine/Textile TOC macros: {{toc}}, {{<toc}}, {{>toc}}, {{ toc }}, {{< toc }} (case-insensitive)
+TOC_RE = re.compile(r"\{\{\s*[<>]?\s*toc\s*\}\}", re.IGNORECASE)
 
-        # Skip nodes inside plain-text-link-body (Confluence link bodies)
-        if 'ac:plain-text-link-body' in parent_tags or 'ac:link' in parent_tags:
-            continue
-
-        if 'script' in parent_tags or 'style' in parent_tags:
-            continue
+# Links are left alone within these tags
+NO_LINK_TAGS = ('code', 'pre', 'notextile')
 
-        new_content = str(url)  # IMPORTANT: work on a plain string
-        for match in url_pattern.finditer(new_content):
-            link = match.group(0)
-            link_html = f'<a href="{link}">{link}</a>'
-            new_content = new_content.replace(link, link_html)
-
-        if new_content != str(url):
-            new_soup = BeautifulSoup(new_content, 'html.parser')
-            url.replace_with(new_soup)
-
-    result = str(soup)
-
-    # Fix CDATA newline issues (introduced by BeautifulSoup)
-    result = re.sub(r'<!\[CDATA\[(.*?)\]\]>', lambda m: '<![CDATA[' + m.group(1).replace('\n', ' ') + ']]>', result, flags=re.S)
-
-    return result
-
-
-def replace_redmine_toc(text: str) -> str:
-    """
-    Replace Redmine/Textile TOC macros ({{toc}}, {{<toc}}, {{>toc}}, case-insensitive)
-    with Confluence storage-format TOC structured macro.
-    """
-
-    toc_macro = (
-        '<ac:structured-macro ac:name="toc">'
-        '<ac:parameter ac:name="printable">true</ac:parameter>'
-        '</ac:structured-macro>'
-    )
-
-    # Matches:
-    # {{toc}}
-    # {{<toc}}
-    # {{>toc}}
-    # {{ toc }}
-    # {{< toc }}
-    pattern = re.compile(
-        r"\{\{\s*[<>]?\s*toc\s*\}\}",
-        re.IGNORECASE
-    )
-
-    return pattern.sub(toc_macro, text)
+# Bare URLs are left alone within these tags (prevents self-linking loops)
+NO_URL_TAGS = NO_LINK_TAGS + ('a', 'ac:plain-text-link-body', 'ac:link', 'script', 'style')
 
 # Matches an escaped inner <code class="bash"> ... </code> that lives inside <pre><code>...</code></pre>
 ESCAPED_INNER_CODE_RE = re.compile(
@@ -246,111 +181,360 @@ def _pick_lang_from_class_attr(class_value: str | None) -> str | None:
     lang = tokens[0].lower() if tokens else None
     return LANG_MAP.get(lang, lang) if lang else None
 
-def convert_code_blocks(html: str) -> str:
+def image_macro(soup, fname):
+    """ Confluence image macro, showing the page attachment fname. """
+    macro = soup.new_tag('ac:image')
+    attachment = soup.new_tag('ri:attachment')
+    attachment['ri:filename'] = fname
+    macro.append(attachment)
+    alt = soup.new_tag('ac:alt')
+    alt.string = fname
+    macro.append(alt)
+    return macro
+
+def page_link_macro(soup, page_name, link_text):
+    """ Confluence link to the imported page page_name. """
+    macro = soup.new_tag('ac:link')
+    page = soup.new_tag('ri:page')
+    page['ri:content-title'] = f"{page_name} ({CONFLUENCE_TITLE_SUFFIX})"
+    macro.append(page)
+    body = soup.new_tag('ac:plain-text-link-body')
+    # Link bodies are kept on a single line
+    body.append(CData(link_text.replace('\n', ' ')))
+    macro.append(body)
+    return macro
+
+def toc_macro(soup):
+    """ Confluence storage-format TOC structured macro. """
+    macro = soup.new_tag('ac:structured-macro')
+    macro['ac:name'] = 'toc'
+    param = soup.new_tag('ac:parameter')
+    param['ac:name'] = 'printable'
+    param.string = 'true'
+    macro.append(param)
+    return macro
+
+def code_block_macro(soup, pre):
     """
-    Convert Pandoc-style code blocks:
+    Confluence code macro for a Pandoc-style code block, or None if pre has no <code>:
       <pre><code>&lt;code class=&quot;bash&quot;&gt;
       echo hi
       &lt;/code&gt;</code></pre>
-    into Confluence code macro (storage).
     """
-    soup = BeautifulSoup(html, "html.parser")
+    outer_code = pre.find("code")
 
-    for pre in soup.find_all("pre"):
-        outer_code = pre.find("code")
+    # If no <code>, treat <pre> as raw code
+    if outer_code is None:
+        return None
 
-        # If no <code>, treat <pre> as raw code
-        if outer_code is None:
-            continue
+    # Decode the *escaped* inner <code ...>...</code>
+    raw = outer_code.decode_contents()
+    unescaped = html_stdlib.unescape(raw)
 
-        # Decode the *escaped* inner <code ...>...</code>
-        raw = outer_code.decode_contents()
-        unescaped = html_stdlib.unescape(raw)
+    m = ESCAPED_INNER_CODE_RE.match(unescaped)
+    if m:
+        attrs = m.group(1) or ""
+        inner = m.group(2) or ""
 
-        m = ESCAPED_INNER_CODE_RE.match(unescaped)
-        if m:
-            attrs = m.group(1) or ""
-            inner = m.group(2) or ""
+        cm = CLASS_ATTR_RE.search(attrs)
+        lang = _pick_lang_from_class_attr(cm.group(1) if cm else None)
 
-            cm = CLASS_ATTR_RE.search(attrs)
-            lang = _pick_lang_from_class_attr(cm.group(1) if cm else None)
+        # Inner may still contain entities; unescape again
+        code_text = html_stdlib.unescape(inner)
+    else:
+        # Normal case: <pre><code class="bash">...</code></pre>
+        lang = _pick_lang_from_class_attr(outer_code.get("class")[0] if outer_code.get("class") else None)
+        code_text = outer_code.get_text("\n")
 
-            # Inner may still contain entities; unescape again
-            code_text = html_stdlib.unescape(inner)
-        else:
-            # Normal case: <pre><code class="bash">...</code></pre>
-            lang = _pick_lang_from_class_attr(outer_code.get("class")[0] if outer_code.get("class") else None)
-            code_text = outer_code.get_text("\n")
+    # Normalize line endings and keep content as-is
+    code_text = (code_text or "").replace("\r\n", "\n").replace("\r", "\n")
+    code_text = _safe_cdata(code_text)
+
+    # Build Confluence code macro
+    macro = soup.new_tag("ac:structured-macro")
+    macro["ac:name"] = "code"
+
+    if lang:
+        p_lang = soup.new_tag("ac:parameter")
+        p_lang["ac:name"] = "language"
+        p_lang.string = lang
+        macro.append(p_lang)
+
+    p_theme = soup.new_tag("ac:parameter")
+    p_theme["ac:name"] = "theme"
+    p_theme.string = "Default"
+    macro.append(p_theme)
+
+    body = soup.new_tag("ac:plain-text-body")
+    body.string = CData(code_text)
+    macro.append(body)
+
+    return macro
+
+def convert_anchor(soup, a):
+    """
+    Convert links to the original redmine: wiki (/projects/../wiki/...) links become
+    confluence page links, and issue (/issues/...) links a jira search by RedmineID.
+    Returns the element that must replace a, if any.
+    """
+    href = a.get('href')
+    if not (href and REDMINE_ORIGIN_URL and href.startswith(REDMINE_ORIGIN_URL)):
+        return None
+
+    rel_link = href.replace(REDMINE_ORIGIN_URL, '')
+    if rel_link.startswith('/projects/') and '/wiki/' in rel_link:
+        # Replace '<a href="...">...</a>' with confluence <ac:link> macro
+        page_name = rel_link.split('/wiki/')[-1].strip().rstrip(':').replace('/', '').replace(' ', '_')
+        link_name = page_name.replace('[', '(').replace(']', ')')
+        return page_link_macro(soup, page_name, link_name)
+    elif '/issues/' in rel_link:
+        # Issue link
+        issue_id = rel_link.split('/issues/')[-1].split('/')[0]
+        a['href'] = f"{CONFLUENCE_URL}/issues/?jql=\"RedmineID:{issue_id}\""
+    return None
+
+def _split_text(pieces, pattern, make_node):
+    """ Split the text (str) pieces on pattern matches, replaced by make_node(match). """
+    result = []
+    for piece in pieces:
+        if not isinstance(piece, str) or not pattern.search(piece):
+            result.append(piece)
+            continue
+        pos = 0
+        for match in pattern.finditer(piece):
+            if match.start() > pos:
+                result.append(piece[pos:match.start()])
+            result.append(make_node(match))
+            pos = match.end()
+        if pos < len(piece):
+            result.append(piece[pos:])
+    return result
 
-        # Normalize line endings and keep content as-is
-        code_text = (code_text or "").replace("\r\n", "\n").replace("\r", "\n")
-        code_text = _safe_cdata(code_text)
+def convert_text(soup, node, ancestors):
+    """
+    Apply text rewrites (wiki links, bare URLs, TOC macros) to a text node, given the
+    names of its ancestors. Returns the nodes that must replace it, or None if unchanged.
+    """
+    text = str(node)
+    pieces = [text]
 
-        # Build Confluence code macro
-        macro = soup.new_tag("ac:structured-macro")
-        macro["ac:name"] = "code"
+    if '[[' in text:
+        def wiki_link(match):
+            page_name = match.group(1).strip().rstrip(':').replace('/', '').replace(' ', '_')
+            link_text = match.group(3).strip() if match.group(3) else page_name
+            link_text = link_text.replace('[', '(').replace(']', ')')
 
-        if lang:
-            p_lang = soup.new_tag("ac:parameter")
-            p_lang["ac:name"] = "language"
-            p_lang.string = lang
-            macro.append(p_lang)
+            if RE_HEAD_PREFIX.match(page_name):
+                page_name = page_name.lstrip('0123456789.').strip()
+            return page_link_macro(soup, page_name, link_text)
+        pieces = _split_text(pieces, WIKI_LINK_RE, wiki_link)
 
-        p_theme = soup.new_tag("ac:parameter")
-        p_theme["ac:name"] = "theme"
-        p_theme.string = "Default"
-        macro.append(p_theme)
+    if 'http' in text and not any(ancestors[t] for t in NO_URL_TAGS):
+        def url_link(match):
+            a = soup.new_tag('a', href=match.group(0))
+            a.string = match.group(0)
+            return a
+        pieces = _split_text(pieces, URL_RE, url_link)
 
-        body = soup.new_tag("ac:plain-text-body")
-        body.string = CData(code_text)
-        macro.append(body)
+    if '{{' in text and not (ancestors['pre'] or ancestors['code']):
+        pieces = _split_text(pieces, TOC_RE, lambda match: toc_macro(soup))
+
+    if len(pieces) == 1 and pieces[0] is text:
+        return None
+    return [NavigableString(piece) if isinstance(piece, str) else piece for piece in pieces]
+
+def _replace_child(parent, index, nodes):
+    """ Replace parent.contents[index] by nodes (without replace_with(), whose index() lookup is a linear scan). """
+    parent.contents[index].extract(_self_index=index)
+    for offset, new_node in enumerate(nodes):
+        parent.insert(index + offset, new_node)
+
+def html_to_storage(html, attachments):
+    """
+    Rewrite pandoc HTML into Confluence storage format, with a single parse, walk and
+    serialization of the document:
+    - images of page attachments become image macros
+    - wiki links ([[Page]] and links to the original redmine) become page links, issue
+      links a jira search, and bare URLs clickable links (outside code blocks)
+    - code blocks become code macros
+    - {{toc}} macros become Confluence TOC macros
+    The names of the ancestors of the current node are counted while walking, so
+    context checks (e.g. 'inside <pre>?') do not walk up the tree, and nodes are
+    replaced by position, so rewrites do not search their siblings either.
+    """
+    filenames = {os.path.basename(f) for f in attachments}
+    soup = BeautifulSoup(html, HTML_PARSER)
+    # lxml wraps fragments into <html><body>
+    root = soup.body if HTML_PARSER != 'html.parser' and soup.body else soup
+
+    ancestors = Counter()
+    # [node, index of the next child to visit]
+    stack = [[root, 0]]
+    while stack:
+        frame = stack[-1]
+        node, index = frame
+
+        if index >= len(node.contents):
+            stack.pop()
+            if node is root:
+                continue
+            ancestors[node.name] -= 1
+            # Code blocks are converted once their content has been walked
+            if node.name == 'pre':
+                macro = code_block_macro(soup, node)
+                if macro is not None:
+                    parent, next_index = stack[-1]
+                    _replace_child(parent, next_index - 1, [macro])
+            continue
 
-        pre.replace_with(macro)
+        child = node.contents[index]
+        frame[1] = index + 1
+
+        if isinstance(child, Tag):
+            replacement = None
+            if child.name == 'img' and child.get('src') in filenames:
+                replacement = image_macro(soup, child['src'])
+            elif child.name == 'a' and not any(ancestors[t] for t in NO_LINK_TAGS):
+                replacement = convert_anchor(soup, child)
+            if replacement is not None:
+                _replace_child(node, index, [replacement])
+                continue
+            ancestors[child.name] += 1
+            stack.append([child, 0])
+        elif type(child) is NavigableString:
+            nodes = convert_text(soup, child, ancestors)
+            if nodes:
+                _replace_child(node, index, nodes)
+                frame[1] = index + len(nodes)
 
-    return soup.encode(formatter=None).decode("utf-8")
+    if root is soup:
+        return soup.encode(formatter=None).decode("utf-8")
+    return root.decode_contents(formatter=None)
 
 
 PLANTUML_BLOCK_RE = re.compile(r"\{\{plantuml\b(.*?)\}\}", re.IGNORECASE | re.DOTALL)
 
-def extract_plantuml_diagrams(pagename, textile, wiki_dir):
-    """ Extracts PlantUML diagrams from textile text. Returns list of diagram codes. """
+def extract_plantuml_diagrams(pagename, textile, wiki_dir, save=True):
+    """
+    Extracts PlantUML diagrams from textile text, saving their code as <page>_diagrams/<page>.umlN.txt.
+    Returns the text with placeholders, and the list of diagram files (.txt, and .png to be
+    rendered by render_plantuml_diagrams). With save=False, only the placeholders are put
+    in (for diagrams already saved).
+    """
     result = []
     output_dir = os.path.join(wiki_dir, f"{pagename}_diagrams")
 
-    if not os.path.exists(output_dir):
+    if save and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     def repl(m: re.Match) -> str:
         """Replaces PlantUML blocks with placeholder and stores diagram code."""
-        idx = len(result) + 1
+        idx = len(result) // 2 + 1
         code = m.group(1).strip()
         code = code.replace('<br/>', '\n').replace('<br />', '\n')
       
         basename = f"{pagename}.uml{idx}"
         filepath = os.path.join(output_dir, basename + '.txt')
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(code)
-
         result.append(filepath)
-
-        filepath = os.path.join(output_dir, basename + '.png')
-
-        with open(filepath, 'wb') as f:
-            proc = subprocess.run(
-                ['plantuml', '-tpng', '-pipe'],
-                input=code.encode('utf-8'),
-                stdout=subprocess.PIPE
-            )
-            f.write(proc.stdout)
-
-        result.append(filepath)
-        print(f"   📊 Saved PlantUML diagram to {filepath}/.txt")
+        result.append(os.path.join(output_dir, basename + '.png'))
+        if save:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(code)
+            print(f"   📊 Saved PlantUML diagram to {filepath}")
 
         return  f'{{{{plantuml:{pagename}.uml{idx}}}}}'
 
     return (PLANTUML_BLOCK_RE.sub(repl, textile), result)
 
+def render_plantuml_pipe(code, png_path):
+    """
+    Render a single diagram, with a plantuml process of its own.
+    Failed renders are reported and not cached, so the next run tries again.
+    """
+    try:
+        proc = subprocess.run(
+            ['plantuml', '-tpng', '-pipe'],
+            input=code.encode('utf-8'),
+            stdout=subprocess.PIPE
+        )
+    except OSError as e:
+        print(f"   ⚠️  PlantUML rendering failed: {e}")
+        return
+    if proc.returncode != 0 or not proc.stdout:
+        print(f"   ⚠️  PlantUML rendering failed (exit code {proc.returncode}, {len(proc.stdout)} bytes of output), not caching it.")
+        return
+    tmp_path = png_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(proc.stdout)
+    os.replace(tmp_path, png_path)
+
+def render_plantuml_batch(codes, cache_dir):
+    """ Render {key: code} diagrams with a single plantuml run (one JVM start), as <cache_dir>/<key>.png. """
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp_dir:
+        paths = []
+        for key, code in codes.items():
+            path = os.path.join(tmp_dir, key + '.puml')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(code)
+            paths.append(path)
+        try:
+            subprocess.run(
+                ['plantuml', '-tpng', '-nbthread', 'auto', '-o', os.path.abspath(tmp_dir)] + paths,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            print(f"   ⚠️  Batched PlantUML rendering failed ({e}), rendering one by one.")
+            return
+        for key in codes:
+            png_path = os.path.join(tmp_dir, key + '.png')
+            if os.path.exists(png_path) and os.path.getsize(png_path):
+                os.replace(png_path, os.path.join(cache_dir, key + '.png'))
+
+def render_plantuml_diagrams(diagram_files):
+    """
+    Render the .png of the given diagrams (.txt/.png pairs from extract_plantuml_diagrams).
+    Renders are cached in <wiki_dir>/.plantuml_cache by hash of the normalized code (the one
+    also embedded in the page), so unchanged diagrams are never rendered again. Missing ones
+    are rendered in batches (one plantuml run per PLANTUML_BATCH_SIZE diagrams), and those a
+    batch did not produce (e.g. '@startuml name' diagrams) one by one, on a small pool.
+    """
+    cache_dir = os.path.join(wiki_dir, PLANTUML_CACHE_FOLDER)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    targets = []
+    missing = {}
+    for txt_path in diagram_files:
+        if not txt_path.endswith('.txt'):
+            continue
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            code = _normalize_plantuml(f.read())
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        cached_path = os.path.join(cache_dir, key + '.png')
+        targets.append((cached_path, txt_path[:-4] + '.png'))
+        if not os.path.exists(cached_path):
+            missing[key] = code
+
+    print(f"📊 {len(targets)} PlantUML diagrams, {len(missing)} to render.")
+    keys = list(missing)
+    for i in range(0, len(keys), PLANTUML_BATCH_SIZE):
+        render_plantuml_batch({key: missing[key] for key in keys[i:i + PLANTUML_BATCH_SIZE]}, cache_dir)
+
+    leftovers = [key for key in keys if not os.path.exists(os.path.join(cache_dir, key + '.png'))]
+    if leftovers:
+        with ThreadPoolExecutor(max_workers=PLANTUML_WORKERS) as executor:
+            list(executor.map(lambda key: render_plantuml_pipe(missing[key], os.path.join(cache_dir, key + '.png')), leftovers))
+
+    for cached_path, png_path in targets:
+        if os.path.exists(cached_path):
+            shutil.copyfile(cached_path, png_path)
+        else:
+            # Do not upload a render left over from an earlier version of the diagram
+            print(f"   ⚠️  PlantUML diagram {png_path} could not be rendered, it is left out of the page.")
+            if os.path.exists(png_path):
+                os.remove(png_path)
+
 PLANTUML_PLACEHOLDER_RE = re.compile(r"\{\{plantuml:(.*?)\}\}", re.IGNORECASE | re.DOTALL)
 
 # 1) Keep this as a mostly-static template copied from Confluence storage,
@@ -537,6 +721,36 @@ def replace_plantuml_placeholders(pagename: str, html_text: str) -> str:
 
     return PLANTUML_PLACEHOLDER_RE.sub(repl, html_text)
 
+def stage_fingerprints():
+    """ Code and converter versions the output of each cached conversion stage depends on. """
+    return {
+        'html': conversion_cache.fingerprint(textile_to_html, pandoc_engine.version()),
+        'storage': conversion_cache.fingerprint(
+            html_to_storage, convert_text, _split_text, convert_anchor, code_block_macro, toc_macro, page_link_macro, image_macro,
+            RE_HEAD_PREFIX, WIKI_LINK_RE, URL_RE, TOC_RE, NO_LINK_TAGS, NO_URL_TAGS,
+            ESCAPED_INNER_CODE_RE, CLASS_ATTR_RE, LANG_MAP, _safe_cdata, _pick_lang_from_class_attr, bs4.__version__
+        ),
+    }
+
+def run_stage(stage, func, text, options=()):
+    """ Run a conversion stage, through the conversion cache when enabled. """
+    if not CONVERSION_CACHE:
+        return func(text)
+    return CONVERSION_CACHE.cached(stage, STAGE_FINGERPRINTS[stage], func, text, options)
+
+def convert_page_body(page, body, files):
+    """
+    Convert the textile body of a page (with PlantUML blocks already extracted) into
+    Confluence storage format. files are the page attachments and images.
+    """
+    filenames = sorted(os.path.basename(f) for f in files)
+    html_body = run_stage('html', textile_to_html, body)
+    options = (filenames, CONFLUENCE_TITLE_SUFFIX, REDMINE_ORIGIN_URL, CONFLUENCE_URL, HTML_PARSER)
+    html_body = run_stage('storage', lambda html: html_to_storage(html, files), html_body, options)
+    # Not cached: diagrams get a new local-id on every conversion
+    html_body = replace_plantuml_placeholders(page, html_body)
+    return html_body
+
 def create_page_hierarchy(wiki_dir):
     hierarchy = {}
     for fname in os.listdir(wiki_dir):
@@ -564,6 +778,10 @@ def create_page_hierarchy(wiki_dir):
         attach_dir = os.path.join(wiki_dir, f"{title}_attachments")
         if os.path.exists(attach_dir):
             attachments = [os.path.join(attach_dir, af) for af in os.listdir(attach_dir)]
+        # Page version history exported with --history, attached as is
+        history = os.path.join(wiki_dir, f"{title}_history.zip")
+        if os.path.exists(history):
+            attachments.append(history)
         images = []
         img_dir = os.path.join(wiki_dir, f"{title}_images")
         if os.path.exists(img_dir):
@@ -581,48 +799,204 @@ def create_page_hierarchy(wiki_dir):
     #raise "fail"
     return hierarchy
 
-def get_page_id(title, space, parent_id=None):
-    results = confluence.get_page_id(space, title)
-    if results:
-        return results
-    return None
+def retry_delay(response, attempt):
+    """ Seconds to wait before retrying response: its Retry-After (seconds or HTTP date), or an exponential backoff. """
+    value = response.headers.get('Retry-After')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    return RETRY_BACKOFF * 2 ** attempt
+
+def confluence_request(method, url, **kwargs):
+    """
+    Send an authenticated request to Confluence, retrying RETRY_STATUS responses (rate
+    limiting, mostly with several pages created in parallel) after the delay they ask for.
+    Files being uploaded are rewound before each attempt.
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        for _, (_, fobj) in kwargs.get('files') or []:
+            fobj.seek(0)
+        response = requests.request(method, url, auth=auth, **kwargs)
+        if response.status_code not in RETRY_STATUS or attempt + 1 == RETRY_ATTEMPTS:
+            return response
+        delay = retry_delay(response, attempt)
+        print(f"   ⏳ Confluence answered HTTP {response.status_code}, retrying in {delay:.0f}s...")
+        sleep(delay)
+
+class PageCreateError(Exception):
+    """ Confluence refused to create a page (status_code is the HTTP status of the response). """
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+class PageIndex:
+    """
+    Titles of the pages in the target space (title => id, parentId and version), listed
+    once at startup and kept up to date as pages are created or removed, so existence
+    checks cost no requests.
+    """
 
-def upload_attachments_to_page(page_id, file_paths):
-    url = f"/rest/api/content/{page_id}/child/attachment"
+    def __init__(self):
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def load(self, space_id, limit=250):
+        """ List all pages of the space, following the cursor pagination of /wiki/api/v2/pages. """
+        url = f"{CONFLUENCE_URL}/wiki/api/v2/pages"
+        params = {'space-id': space_id, 'limit': limit}
+        while url:
+            response = confluence_request('GET', url, params=params, headers=JSON_HEADERS)
+            if response.status_code != 200:
+                raise Exception(f"Failed to list pages of space '{space_id}': HTTP {response.status_code}\n{response.text}")
+            data = response.json()
+            for item in data.get('results', []):
+                self.add(item['title'], item['id'], item.get('parentId'), (item.get('version') or {}).get('number'))
+            # The next link keeps the query (with a cursor), and is relative to the site
+            next_link = data.get('_links', {}).get('next')
+            url = f"{CONFLUENCE_URL}{next_link}" if next_link else None
+            params = None
+        print(f"🗂️  Indexed {len(self.pages)} existing pages of space '{CONFLUENCE_SPACE_KEY}'.")
+
+    def lookup(self, space_id, title):
+        """
+        Look a title up on Confluence (e.g. a page created after the index was loaded),
+        adding it to the index. Returns it as get() does, or None.
+        """
+        url = f"{CONFLUENCE_URL}/wiki/api/v2/pages"
+        response = confluence_request('GET', url, params={'space-id': space_id, 'title': title}, headers=JSON_HEADERS)
+        if response.status_code != 200:
+            raise Exception(f"Failed to look up page '{title}': HTTP {response.status_code}\n{response.text}")
+        for item in response.json().get('results', []):
+            if item['title'] == title:
+                self.add(item['title'], item['id'], item.get('parentId'), (item.get('version') or {}).get('number'))
+                return self.get(title)
+        return None
+
+    def get(self, title):
+        """ {'id', 'parentId', 'version'} of the page titled title, or None. """
+        with self.lock:
+            return self.pages.get(title)
+
+    def add(self, title, page_id, parent_id=None, version=None):
+        with self.lock:
+            self.pages[title] = {'id': page_id, 'parentId': parent_id, 'version': version}
+
+    def remove(self, title):
+        with self.lock:
+            self.pages.pop(title, None)
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def attachment_batches(files):
+    """ Split (path, filename, size, digest) tuples into batches of ATTACHMENT_BATCH_SIZE files / ATTACHMENT_BATCH_BYTES. """
+    batch, batch_bytes = [], 0
+    for entry in files:
+        if batch and (len(batch) >= ATTACHMENT_BATCH_SIZE or batch_bytes + entry[2] > ATTACHMENT_BATCH_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(entry)
+        batch_bytes += entry[2]
+    if batch:
+        yield batch
+
+def upload_attachment_batch(page_id, batch):
+    """
+    Upload several files to a page in one multipart request. PUT creates the attachments,
+    or adds a new version to those of the same name. Each file gets its sha256 as comment.
+    """
+    url = f"{CONFLUENCE_URL}/wiki/rest/api/content/{page_id}/child/attachment"
+    names = ', '.join(filename for _, filename, _, _ in batch)
+    fobjs = []
+    try:
+        for path, _, _, _ in batch:
+            fobjs.append(open(path, 'rb'))
+        files = [('file', (filename, fobj)) for (_, filename, _, _), fobj in zip(batch, fobjs)]
+        data = {
+            'comment': [f"{ATTACHMENT_HASH_PREFIX}{digest}" for _, _, _, digest in batch],
+            'minorEdit': 'true'
+        }
+        response = confluence_request('PUT', url, headers={'X-Atlassian-Token': 'nocheck'}, files=files, data=data)
+    except (OSError, requests.RequestException) as e:
+        print(f"   ❌ Exception uploading {names}: {e}")
+        if FAIL_FAST:
+            raise
+        return False
+    finally:
+        for fobj in fobjs:
+            fobj.close()
+    if response.status_code not in (200, 201):
+        print(f"   ❌ Failed to upload {names}: HTTP {response.status_code}\n{response.text}")
+        return False
+    print(f"   📎 Uploaded {names} to page {page_id}")
+    return True
+
+def upload_attachments_to_page(page_id, file_paths, existing=None):
+    """
+    Upload files to a page, skipping the ones already attached: same name, and the same
+    sha256 in the attachment comment (or the same size, for attachments not uploaded by
+    this script). Files listed twice (e.g. in both _attachments and _images) are sent once.
+    existing is the get_page_attachments() listing, fetched when not given ({} for new pages).
+    Batches of files are uploaded in parallel on the UPLOAD_EXECUTOR pool.
+    Failures are reported and do not stop the import (unless FAIL_FAST).
+    """
+    if existing is None:
+        try:
+            existing = get_page_attachments(page_id)
+        except Exception as e:
+            print(f"   ❌ Could not list attachments of page {page_id}, none uploaded: {e}")
+            if FAIL_FAST:
+                raise
+            return
+
+    pending = {}
     for file_path in file_paths:
         filename = os.path.basename(file_path)
-        filesize = os.path.getsize(file_path)
-        print(f"   ⏳ Uploading {filename} ({filesize} bytes) to page {page_id}")
-        if filesize == 0:
-            print(f"   ⚠️  Skipping empty file: {filename}")
+        try:
+            filesize = os.path.getsize(file_path)
+            if filesize == 0:
+                print(f"   ⚠️  Skipping empty file: {filename}")
+                continue
+            digest = file_sha256(file_path)
+        except OSError as e:
+            print(f"   ❌ Could not read {filename}: {e}")
+            if FAIL_FAST:
+                raise
             continue
-        with open(file_path, 'rb') as fobj:
-            files = {'file': (filename, fobj)}
-            try:
-                resp = confluence.request(
-                    method='POST',
-                    path=url,
-                    files=files,
-                    headers={'X-Atlassian-Token': 'nocheck'}
-                )
-                # Check response for status or text
-                if hasattr(resp, 'status_code'):
-                    status = resp.status_code
-                    text = resp.text
-                else:
-                    status = resp.get('statusCode', 'n/a')
-                    text = str(resp)
-                if status in (200, 201):
-                    print(f"   📎 Uploaded {filename} to Confluence page")
-                else:
-                    print(f"   ❌ Failed to upload {filename}: HTTP {status}\n{text}")
-            except Exception as e:
-                err = str(e)
-                if "existing attachment" in err:
-                    print(f"   ⚠️  Attachment {filename} already exists on page. Skipping upload..")
+        if filename in pending:
+            if pending[filename][3] != digest:
+                print(f"   ⚠️  Different files named {filename}, uploading {pending[filename][0]} only.")
+            continue
+        current = existing.get(filename)
+        if current:
+            comment = current.get('comment') or ''
+            if comment.startswith(ATTACHMENT_HASH_PREFIX):
+                if comment[len(ATTACHMENT_HASH_PREFIX):] == digest:
                     continue
-                print(f"   ❌ Exception uploading {filename}: {e}")
+            elif current.get('fileSize') == filesize:
                 continue
+        pending[filename] = (file_path, filename, filesize, digest)
+
+    if not pending:
+        if file_paths:
+            print(f"   📎 Attachments of page {page_id} are up to date.")
+        return
+
+    print(f"   ⏳ Uploading {len(pending)} files ({sum(e[2] for e in pending.values())} bytes) to page {page_id}")
+    futures = [UPLOAD_EXECUTOR.submit(upload_attachment_batch, page_id, batch) for batch in attachment_batches(pending.values())]
+    failed = [f for f in futures if not f.result()]
+    if failed:
+        print(f"   ❌ {len(failed)} of {len(futures)} attachment uploads to page {page_id} failed.")
 
 def create_page(
     spaceid,
@@ -657,7 +1031,7 @@ def create_page(
         data["parentId"] = parent_id
 
     try:
-        response = requests.post(url, auth=auth, headers=JSON_HEADERS, json=data)
+        response = confluence_request('POST', url, headers=JSON_HEADERS, json=data)
     except requests.HTTPError as e:
         if e.response.status_code == 404:
             raise ApiPermissionError(
@@ -668,7 +1042,7 @@ def create_page(
         raise
 
     if response.status_code not in (200, 201):
-        raise Exception(f"Failed to create page '{title}': HTTP {response.status_code}\n{response.text}")
+        raise PageCreateError(response.status_code, f"Failed to create page '{title}': HTTP {response.status_code}\n{response.text}")
 
 
     # Set page as full width
@@ -680,7 +1054,7 @@ def create_page(
     }
 
     for attempt in range(3):
-        response_fullwidth = requests.post(url_fullwidth, auth=auth, headers=JSON_HEADERS, json=data)
+        response_fullwidth = confluence_request('POST', url_fullwidth, headers=JSON_HEADERS, json=data)
 
         if response_fullwidth.status_code in (200, 201):
             break;
@@ -696,147 +1070,474 @@ def create_page(
     return response.json()
 
 
-def create_confluence_wiki(wiki_dir):
-    hierarchy = create_page_hierarchy(wiki_dir)
-    created_pages = {}
+def storage_hash(body):
+    """
+    Hash of a converted storage format body, ignoring what changes between conversions
+    of the same page (ids generated per conversion, whitespace between tags).
+    """
+    body = STORAGE_VOLATILE_RE.sub(r'\1', body)
+    body = re.sub(r'>\s+<', '><', body)
+    body = re.sub(r'\s+', ' ', body).replace(' />', '/>')
+    return hashlib.sha256(body.strip().encode('utf-8')).hexdigest()
+
+def get_page_version(page_id):
+    """ Current version number of a page. """
+    url = f"{CONFLUENCE_URL}/wiki/api/v2/pages/{page_id}"
+    response = confluence_request('GET', url, headers=JSON_HEADERS)
+    if response.status_code != 200:
+        raise Exception(f"Failed to get page {page_id}: HTTP {response.status_code}\n{response.text}")
+    return response.json()['version']['number']
 
-    print(f"⚙️  Starting import of {len(hierarchy)} pages into Confluence space '{CONFLUENCE_SPACE_KEY}'")
+def get_page_property(page_id, key):
+    """ Content property key of a page (with its 'id', 'value' and 'version'), or None. """
+    url = f"{CONFLUENCE_URL}/wiki/api/v2/pages/{page_id}/properties"
+    response = confluence_request('GET', url, params={'key': key}, headers=JSON_HEADERS)
+    if response.status_code != 200:
+        raise Exception(f"Failed to get property '{key}' of page {page_id}: HTTP {response.status_code}\n{response.text}")
+    for item in response.json().get('results', []):
+        if item.get('key') == key:
+            return item
+    return None
 
-    # First, create all root pages (no parent)
-    for page, info in hierarchy.items():
-        title = f"{page} ({CONFLUENCE_TITLE_SUFFIX})"
+def set_page_property(page_id, key, value, current=None):
+    """ Create content property key of a page, or update it when current (as returned by get_page_property) is given. """
+    url = f"{CONFLUENCE_URL}/wiki/api/v2/pages/{page_id}/properties"
+    data = {"key": key, "value": value}
+    if current:
+        data["version"] = {"number": current['version']['number'] + 1}
+        response = confluence_request('PUT', f"{url}/{current['id']}", headers=JSON_HEADERS, json=data)
+    else:
+        response = confluence_request('POST', url, headers=JSON_HEADERS, json=data)
+    if response.status_code not in (200, 201):
+        raise Exception(f"Failed to set property '{key}' of page {page_id}: HTTP {response.status_code}\n{response.text}")
 
-        if info['parent'] is None:
-            print(f"➡️  Creating root page '{title}'...")
+def record_body_hash(page_id, title, body_hash, current=None):
+    """ Store the hash of the body sent to a page (see overwrite_page), a warning if it fails. """
+    try:
+        set_page_property(page_id, BODY_HASH_PROPERTY, {'sha256': body_hash}, current)
+    except Exception as e:
+        print(f"   ⚠️ Could not record the body hash of page '{title}', it will be updated again on the next run: {e}")
 
-            with open(info['file'], 'r', encoding='utf-8') as f:
-                raw_content = f.read()
-            split = raw_content.find('---\n\n')
-            if split != -1:
-                body = raw_content[split+5:]
-            else:
-                body = raw_content
-            (body, diagrams) = extract_plantuml_diagrams(page, body, wiki_dir)
-            html_body = textile_to_html(body)
-            html_body = html_replace_img_with_confluence_macro(html_body, info['attachments'] + info['images'])
-            html_body = html_convert_links(html_body)
-            html_body = convert_code_blocks(html_body)
-            html_body = replace_redmine_toc(html_body)
-            html_body = replace_plantuml_placeholders(page, html_body)
-
-            with open(info['file'][:-4] + '.html', 'w', encoding='utf-8') as fhtml:
-                fhtml.write(html_body)
-
-            if CONFLUENCE_OVERWRITE_EXISTING and page in CONFLUENCE_OVERWRITE_EXISTING or '*' in CONFLUENCE_OVERWRITE_EXISTING:
-                existing_page_id = get_page_id(title, CONFLUENCE_SPACE_KEY)
-                if existing_page_id:
-                    print(f"   🗑️  Deleting existing page '{title}' with ID {existing_page_id}...")
-                    confluence.remove_page(existing_page_id)
+def update_page(page_id, title, body, version, parent_id=None):
+    """ Save body as a new version (version + 1) of an existing page, moving it under parent_id if given. """
+    url = f"{CONFLUENCE_URL}/wiki/api/v2/pages/{page_id}"
+    data = {
+        "id": page_id,
+        "status": "current",
+        "title": title,
+        "body": {
+            "representation": "storage",
+            "value": body,
+        },
+        "version": {
+            "number": version + 1,
+            "message": "Updated by redmine import",
+        },
+    }
+    if parent_id:
+        data["parentId"] = parent_id
+    response = confluence_request('PUT', url, headers=JSON_HEADERS, json=data)
+    if response.status_code != 200:
+        raise Exception(f"Failed to update page '{title}': HTTP {response.status_code}\n{response.text}")
+    return response.json()
 
-            try:
-            # print status, including emoji
-                result = create_page(
-                    spaceid=CONFLUENCE_SPACE_ID,
-                    title=title,
-                    body=html_body,
-                    parent_id=CONFLUENCE_PARENT_FOLDER,
-                    representation='storage'
-                )
-                page_id = created_pages[page] = result['id']
-                print(f"   ✅ Created page '{title}' with ID {result['id']}")
-                upload_attachments_to_page(page_id, info['attachments'] + info['images'] + diagrams + [info['file']])
-            except Exception as e:
-                error_str = str(e)
-                if "already exists" in error_str:
-                    print(f"⚠️ Page '{title}' already exists. Skipping creation. ({e})")
-                    page_id = confluence.get_page_id(CONFLUENCE_SPACE_KEY, title)
-                    if not page_id:
-                        print(f"    ⚠️ Could not find existing page ID for '{title}', skipping attachments.")
+def get_page_attachments(page_id, limit=250):
+    """ {filename: {'fileSize', 'comment'}} of the attachments of a page. """
+    attachments = {}
+    url = f"{CONFLUENCE_URL}/wiki/api/v2/pages/{page_id}/attachments"
+    params = {'limit': limit}
+    while url:
+        response = confluence_request('GET', url, params=params, headers=JSON_HEADERS)
+        if response.status_code != 200:
+            raise Exception(f"Failed to list attachments of page {page_id}: HTTP {response.status_code}\n{response.text}")
+        data = response.json()
+        for item in data.get('results', []):
+            attachments[item['title']] = {'fileSize': item.get('fileSize'), 'comment': item.get('comment')}
+        next_link = data.get('_links', {}).get('next')
+        url = f"{CONFLUENCE_URL}{next_link}" if next_link else None
+        params = None
+    return attachments
+
+def overwrite_page(existing, title, html_body, parent_id, files, body_hash):
+    """
+    Bring an existing page up to date in place (--overwrite-mode update): its body is only
+    saved when body_hash differs from the one recorded when the page was last written by
+    this script, and only new or changed attachments are uploaded.
+    (Confluence stores bodies re-serialized, so they can not be compared to ours directly.)
+    """
+    page_id = existing['id']
+    recorded = get_page_property(page_id, BODY_HASH_PROPERTY)
+    move = parent_id if parent_id and parent_id != existing['parentId'] else None
+    if recorded and recorded.get('value', {}).get('sha256') == body_hash and not move:
+        print(f"   💤 Page '{title}' (ID {page_id}) is unchanged.")
+    else:
+        version = get_page_version(page_id)
+        result = update_page(page_id, title, html_body, version, move)
+        PAGE_INDEX.add(title, page_id, parent_id or existing['parentId'], (result.get('version') or {}).get('number'))
+        print(f"   🔄 Updated page '{title}' (ID {page_id}) to version {version + 1}")
+        record_body_hash(page_id, title, body_hash, recorded)
+    upload_attachments_to_page(page_id, files)
+
+def update_existing_page(existing, title, html_body, parent_id, files, body_hash):
+    """ overwrite_page(), returning the page id, or None if it failed. """
+    try:
+        overwrite_page(existing, title, html_body, parent_id, files, body_hash)
+    except Exception as e:
+        print(f"⚠️ Exception while updating page '{title}': {e}")
+        if FAIL_FAST:
+            raise
+        return None
+    return existing['id']
+
+def lookup_conflicting_page(error, title):
+    """ When creating title failed as it already exists (HTTP 400/409), the existing page (see PageIndex.get), else None. """
+    if getattr(error, 'status_code', None) not in (400, 409):
+        return None
+    try:
+        return PAGE_INDEX.lookup(CONFLUENCE_SPACE_ID, title)
+    except Exception as e:
+        print(f"⚠️ {e}")
+        return None
+
+def import_page(page, info, parent_id):
+    """
+    Create a converted page (info['body_file']) in Confluence under parent_id, with its
+    attachments. Returns the id of the page, or None if it could not be created.
+    """
+    title = f"{page} ({CONFLUENCE_TITLE_SUFFIX})"
+    if info['parent'] is None:
+        print(f"➡️  Creating root page '{title}'...")
+    else:
+        print(f"➡️  Creating child page '{title}' under parent '{info['parent']} ({CONFLUENCE_TITLE_SUFFIX})'...")
+
+    diagrams = info['diagrams']
+    with open(info['body_file'], 'r', encoding='utf-8') as f:
+        html_body = f.read()
+    body_hash = info.get('body_hash') or storage_hash(html_body)
+
+    files = info['attachments'] + info['images'] + diagrams + [info['file']]
+    existing = PAGE_INDEX.get(title)
+    overwrite = CONFLUENCE_OVERWRITE_EXISTING and page in CONFLUENCE_OVERWRITE_EXISTING or '*' in CONFLUENCE_OVERWRITE_EXISTING
+    if existing and overwrite and CONFLUENCE_OVERWRITE_MODE == 'update':
+        return update_existing_page(existing, title, html_body, parent_id, files, body_hash)
+
+    if existing and overwrite:
+        print(f"   🗑️  Deleting existing page '{title}' with ID {existing['id']}...")
+        confluence.remove_page(existing['id'])
+        PAGE_INDEX.remove(title)
+        existing = None
+
+    if existing:
+        page_id = existing['id']
+        print(f"⚠️ Page '{title}' already exists with ID {page_id}. Skipping creation.")
+    else:
+        try:
+            result = create_page(
+                spaceid=CONFLUENCE_SPACE_ID,
+                title=title,
+                body=html_body,
+                parent_id=parent_id,
+                representation='storage'
+            )
+        except Exception as e:
+            # A title conflict: the page was created after the index was loaded
+            existing = lookup_conflicting_page(e, title)
+            if not existing:
+                print(f"⚠️ Exception while creating page '{title}': {e}")
+                if FAIL_FAST:
+                    raise
+                return None
+            print(f"⚠️ Page '{title}' already exists with ID {existing['id']}. Skipping creation.")
+            if overwrite and CONFLUENCE_OVERWRITE_MODE == 'update':
+                return update_existing_page(existing, title, html_body, parent_id, files, body_hash)
+            page_id = existing['id']
+        else:
+            page_id = result['id']
+            PAGE_INDEX.add(title, page_id, parent_id, (result.get('version') or {}).get('number'))
+            print(f"   ✅ Created page '{title}' with ID {page_id}")
+            record_body_hash(page_id, title, body_hash)
+
+    # A new page has no attachments yet, no need to list them
+    upload_attachments_to_page(page_id, files, existing=None if existing else {})
+    return page_id
+
+def schedule_pages(hierarchy):
+    """
+    Import the pages of hierarchy, overlapping conversion with creation:
+    - pages are converted ahead on a pool of COMPILE_WORKERS processes, in breadth-first
+      order (parents first), at most PIPELINE_WINDOW pages ahead of the ones created
+    - a pool of CONCURRENCY threads creates each converted page as soon as its parent
+      has been created, so siblings and independent subtrees are created in parallel
+    Pages already converted (--publish) go straight to creation.
+    Returns {page: id} of the pages created.
+    """
+    children = defaultdict(list)
+    for page, info in hierarchy.items():
+        children[info['parent']].append(page)
+
+    # Pages that can be placed, parents first
+    order = list(children[None])
+    for page in order:
+        order.extend(children[page])
+    order = deque(order)
+
+    created_pages = {}
+    parent_ids = {page: CONFLUENCE_PARENT_FOLDER for page in children[None]}
+    window = set()  # pages being converted, or converted and not created yet
+    converted = set()  # converted pages waiting for their parent
+    dropped = set()
+
+    def drop(page):
+        """ page was not created: its subtree can not be placed, stop converting it. """
+        stack = list(children[page])
+        while stack:
+            child = stack.pop()
+            dropped.add(child)
+            window.discard(child)
+            converted.discard(child)
+            stack.extend(children[child])
+
+    with ProcessPoolExecutor(max_workers=COMPILE_WORKERS, initializer=init_compile_worker, initargs=(compile_settings(),)) as converter, \
+            ThreadPoolExecutor(max_workers=CONCURRENCY) as publisher:
+        pending = {}
+        try:
+            while True:
+                while order and len(window) < PIPELINE_WINDOW:
+                    page = order.popleft()
+                    if page in dropped:
                         continue
+                    info = hierarchy[page]
+                    window.add(page)
+                    if 'body_file' in info:
+                        converted.add(page)
                     else:
-                        created_pages[page] = page_id
-                        upload_attachments_to_page(page_id, info['attachments'] + info['images'] + diagrams + [info['file']])
-                    continue
-                else:
-                    print(f"⚠️ Exception while creating page '{title}': {e}")
-                    if FAIL_FAST:
-                        raise
-                    continue
+                        # Written next to the page, as a record of what was sent
+                        body_file = info['file'][:-4] + '.html'
+                        future = converter.submit(compile_page, page, info['file'], info['attachments'] + info['images'], body_file)
+                        pending[future] = ('convert', page)
 
-    # Then, create all child pages
-    pages_remaining = {k: v for k, v in hierarchy.items() if v['parent'] is not None}
-    progress = True
-    while pages_remaining and progress:
-        progress = False
-        for page, info in list(pages_remaining.items()):
-            title = f"{page} ({CONFLUENCE_TITLE_SUFFIX})"
-            parent = info['parent']
-            if parent in created_pages:
-                print(f"➡️  Creating child page '{title}' under parent '{parent} ({CONFLUENCE_TITLE_SUFFIX})'...")
-
-                with open(info['file'], 'r', encoding='utf-8') as f:
-                    raw_content = f.read()
-                split = raw_content.find('---\n\n')
-                if split != -1:
-                    body = raw_content[split+5:]
-                else:
-                    body = raw_content
-                (body, diagrams) = extract_plantuml_diagrams(page, body, wiki_dir)
-                html_body = textile_to_html(body)
-                html_body = html_replace_img_with_confluence_macro(html_body, info['attachments'] + info['images'])
-                html_body = html_convert_links(html_body)
-                html_body = convert_code_blocks(html_body)
-                html_body = replace_redmine_toc(html_body)
-                html_body = replace_plantuml_placeholders(page, html_body)
-
-                with open(info['file'][:-4] + '.html', 'w', encoding='utf-8') as fhtml:
-                    fhtml.write(html_body)
-
-                if CONFLUENCE_OVERWRITE_EXISTING and page in CONFLUENCE_OVERWRITE_EXISTING or '*' in CONFLUENCE_OVERWRITE_EXISTING:
-                    existing_page_id = get_page_id(title, CONFLUENCE_SPACE_KEY)
-                    if existing_page_id:
-                        print(f"   🗑️  Deleting existing page '{title}' with ID {existing_page_id}...")
-                        confluence.remove_page(existing_page_id)
-
-                try:
-                    print(f"➡️  Creating child page '{title}'...")
-                    result = create_page(
-                        spaceid=CONFLUENCE_SPACE_ID,
-                        title=title,
-                        body=html_body,
-                        parent_id=created_pages[parent],
-                        representation='storage'
-                    )
-                    print(f"   ✅ Created page '{title}' with ID {result['id']}")
-                    page_id = created_pages[page] = result['id']
-                    upload_attachments_to_page(page_id, info['attachments'] + info['images'] + diagrams + [info['file']])
-                    del pages_remaining[page]
-                    progress = True
-                except Exception as e:
-                    error_str = str(e)
-                    if "already exists" in error_str:
-                        print(f"⚠️ Page '{title}' already exists. Skipping creation.")
-                        page_id = confluence.get_page_id(CONFLUENCE_SPACE_KEY, title)
-                        if not page_id:
-                            print(f"    ⚠️ Could not find existing page ID for '{title}', skipping attachments.")
+                for page in [p for p in converted if p in parent_ids]:
+                    converted.discard(page)
+                    pending[publisher.submit(import_page, page, hierarchy[page], parent_ids[page])] = ('create', page)
+
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, page = pending.pop(future)
+                    if stage == 'convert':
+                        try:
+                            _, body_file, body_hash, hits, misses = future.result()
+                        except Exception as e:
+                            print(f"⚠️ Exception while converting page '{page}': {e}")
+                            if FAIL_FAST:
+                                raise
+                            window.discard(page)
+                            drop(page)
                             continue
-                        else:
-                            created_pages[page] = page_id
-                            upload_attachments_to_page(page_id, info['attachments'] + info['images'] + diagrams + [info['file']])
-                            del pages_remaining[page]
-                            progress = True
-                        continue
+                        add_conversion_counts(hits, misses)
+                        if page in dropped:
+                            continue
+                        hierarchy[page]['body_file'] = body_file
+                        hierarchy[page]['body_hash'] = body_hash
+                        converted.add(page)
                     else:
-                        print(f"⚠️ Exception while creating page '{title}': {e}")
-                        if FAIL_FAST:
-                            raise
-                        continue
+                        window.discard(page)
+                        page_id = future.result()
+                        if not page_id:
+                            drop(page)
+                            continue
+                        created_pages[page] = page_id
+                        for child in children[page]:
+                            parent_ids[child] = page_id
+        except BaseException:
+            # --fail-fast (or Ctrl-C): drop the pages not started yet
+            converter.shutdown(wait=False, cancel_futures=True)
+            publisher.shutdown(wait=False, cancel_futures=True)
+            raise
+    return created_pages
+
+def read_page_body(path):
+    """ Textile body of an exported page (after its metadata header). """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_content = f.read()
+    split = raw_content.find('---\n\n')
+    if split != -1:
+        return raw_content[split+5:]
+    return raw_content
+
+def prepare_pages(wiki_dir):
+    """
+    Page hierarchy of the export, with the PlantUML diagrams of every page saved and rendered.
+    Page bodies are not kept, conversion workers read them again (see compile_page).
+    """
+    hierarchy = create_page_hierarchy(wiki_dir)
+
+    # Collect the diagrams of all pages first, so they are rendered together
+    all_diagrams = []
+    for page, info in hierarchy.items():
+        _, info['diagrams'] = extract_plantuml_diagrams(page, read_page_body(info['file']), wiki_dir)
+        all_diagrams.extend(info['diagrams'])
+    render_plantuml_diagrams(all_diagrams)
+    return hierarchy
+
+def compile_options():
+    """ Settings the storage format of the pages depends on, checked by --publish against the manifest. """
+    return {
+        'title_suffix': CONFLUENCE_TITLE_SUFFIX,
+        'origin_url': REDMINE_ORIGIN_URL,
+        'confluence_url': CONFLUENCE_URL,
+        'html_parser': HTML_PARSER,
+    }
+
+def compile_settings():
+    """ Settings of the conversion worker processes (see init_compile_worker). """
+    return dict(compile_options(),
+        wiki_dir=wiki_dir,
+        pandoc_server=pandoc_engine.USE_SERVER,
+        conversion_cache=CONVERSION_CACHE is not None
+    )
+
+def init_compile_worker(settings):
+    """ Set up the globals of a conversion worker process (settings as returned by compile_settings). """
+    global wiki_dir, CONFLUENCE_URL, CONFLUENCE_TITLE_SUFFIX, REDMINE_ORIGIN_URL, HTML_PARSER
+    global CONVERSION_CACHE, STAGE_FINGERPRINTS
+    wiki_dir = settings['wiki_dir']
+    CONFLUENCE_URL = settings['confluence_url']
+    CONFLUENCE_TITLE_SUFFIX = settings['title_suffix']
+    REDMINE_ORIGIN_URL = settings['origin_url']
+    HTML_PARSER = settings['html_parser']
+    pandoc_engine.USE_SERVER = settings['pandoc_server']
+    if settings['conversion_cache']:
+        CONVERSION_CACHE = conversion_cache.ConversionCache(os.path.join(wiki_dir, conversion_cache.CACHE_FOLDER))
+        STAGE_FINGERPRINTS = stage_fingerprints()
+    # atexit handlers do not run in pool processes, finalizers do
+    multiprocessing.util.Finalize(None, pandoc_engine.stop_server, exitpriority=10)
+
+def compile_page(page, page_file, files, body_file):
+    """
+    Convert a page (exported as page_file, its diagrams saved by prepare_pages) in a
+    conversion worker, into body_file.
+    Returns (page, body file, body hash, conversion cache hits, misses).
+    """
+    hits, misses = (CONVERSION_CACHE.hits, CONVERSION_CACHE.misses) if CONVERSION_CACHE else (0, 0)
+    body, _ = extract_plantuml_diagrams(page, read_page_body(page_file), wiki_dir, save=False)
+    html_body = convert_page_body(page, body, files)
+    with open(body_file, 'w', encoding='utf-8') as f:
+        f.write(html_body)
+    if CONVERSION_CACHE:
+        hits, misses = CONVERSION_CACHE.hits - hits, CONVERSION_CACHE.misses - misses
+    return (page, body_file, storage_hash(html_body), hits, misses)
+
+def add_conversion_counts(hits, misses):
+    """ Count conversion cache hits/misses of a worker process in the report of this one. """
+    if CONVERSION_CACHE:
+        with CONVERSION_CACHE.lock:
+            CONVERSION_CACHE.hits += hits
+            CONVERSION_CACHE.misses += misses
+
+def compile_wiki(wiki_dir, compile_dir):
+    """
+    Convert all pages into storage format files under compile_dir, on a pool of worker
+    processes, plus a manifest.json describing each page (title, parent, files to attach,
+    body file and hash) for --publish. Nothing is sent to Confluence.
+    """
+    hierarchy = prepare_pages(wiki_dir)
+    os.makedirs(compile_dir, exist_ok=True)
+    print(f"⚙️  Compiling {len(hierarchy)} pages into '{compile_dir}'")
+
+    compiled = {}
+    with ProcessPoolExecutor(max_workers=COMPILE_WORKERS, initializer=init_compile_worker, initargs=(compile_settings(),)) as executor:
+        futures = [
+            executor.submit(compile_page, page, info['file'], info['attachments'] + info['images'], os.path.join(compile_dir, f"{page}.xml"))
+            for page, info in hierarchy.items()
+        ]
+        for future in as_completed(futures):
+            try:
+                page, body_file, body_hash, page_hits, page_misses = future.result()
+            except Exception as e:
+                print(f"⚠️ Exception while compiling page: {e}")
+                if FAIL_FAST:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+                continue
+            compiled[page] = (body_file, body_hash)
+            add_conversion_counts(page_hits, page_misses)
+            print(f"   ✅ Compiled page '{page}'")
+
+    def rel(path):
+        return os.path.relpath(path, wiki_dir)
+
+    manifest = {'options': compile_options(), 'pages': {}}
+    for page, info in hierarchy.items():
+        if page not in compiled:
+            continue
+        body_file, body_hash = compiled[page]
+        manifest['pages'][page] = {
+            'title': f"{page} ({CONFLUENCE_TITLE_SUFFIX})",
+            'parent': info['parent'],
+            'file': rel(info['file']),
+            'attachments': [rel(f) for f in info['attachments']],
+            'images': [rel(f) for f in info['images']],
+            'diagrams': [rel(f) for f in info['diagrams']],
+            'body_file': rel(body_file),
+            'body_hash': body_hash,
+        }
+    with open(os.path.join(compile_dir, COMPILE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"📦 Compiled {len(compiled)} of {len(hierarchy)} pages, manifest written to '{os.path.join(compile_dir, COMPILE_MANIFEST)}'.")
+    if CONVERSION_CACHE:
+        CONVERSION_CACHE.report()
+
+def load_compiled_pages(wiki_dir, compile_dir):
+    """ Page hierarchy of a --compile-only manifest, in the form used by import_page(). """
+    with open(os.path.join(compile_dir, COMPILE_MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest['options'] != compile_options():
+        raise Exception(f"Pages were compiled with other settings ({manifest['options']}), compile them again.")
 
-    if pages_remaining:
+    def abs_path(path):
+        return os.path.join(wiki_dir, path)
+
+    hierarchy = {}
+    for page, entry in manifest['pages'].items():
+        if PAGES and page not in PAGES:
+            continue
+        hierarchy[page] = {
+            'file': abs_path(entry['file']),
+            'parent': entry['parent'],
+            'attachments': [abs_path(f) for f in entry['attachments']],
+            'images': [abs_path(f) for f in entry['images']],
+            'diagrams': [abs_path(f) for f in entry['diagrams']],
+            'body_file': abs_path(entry['body_file']),
+            'body_hash': entry['body_hash'],
+        }
+    print(f"📦 Loaded {len(hierarchy)} compiled pages from '{compile_dir}'.")
+    return hierarchy
+
+def create_confluence_wiki(wiki_dir, compile_dir=None):
+    """ Import the wiki export into Confluence, from the --compile-only output in compile_dir if given. """
+    global PAGE_INDEX, UPLOAD_EXECUTOR
+    hierarchy = load_compiled_pages(wiki_dir, compile_dir) if compile_dir else prepare_pages(wiki_dir)
+
+    print(f"⚙️  Starting import of {len(hierarchy)} pages into Confluence space '{CONFLUENCE_SPACE_KEY}'")
+
+    PAGE_INDEX = PageIndex()
+    PAGE_INDEX.load(CONFLUENCE_SPACE_ID)
+    UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=ATTACHMENT_WORKERS)
+
+    # Pages are created as soon as their parent is, see schedule_pages()
+    created_pages = schedule_pages(hierarchy)
+    unplaced = [page for page in hierarchy if page not in created_pages]
+    if unplaced:
         print("⚠️ These pages could not be placed due to missing parent(s):")
-        for k in pages_remaining:
+        for k in unplaced:
             print(f"  - {k}")
 
+    if CONVERSION_CACHE:
+        CONVERSION_CACHE.report()
+
 
 def get_spaceid_by_key(space_key):
     """
@@ -900,9 +1601,20 @@ def get_folder_id_by_name(folder_name):
 #  --confluence-page-root => Confluence base page title (the one mapped to Wiki on redmine)
 #  --confiuence-page-suffix => suffix to add to all page titles (default: 'Legacy')
 #  --origin-url => Redmine instance URL
-#  --overwrite => overwrite (delete+create) existing pages passed (or '*' for all)
+#  --overwrite => overwrite existing pages passed (or '*' for all)
+#  --overwrite-mode => how pages are overwritten: update (in place, only when changed; default) or recreate (delete+create)
 #  --fail-fast => stop on first error
 #  --pages => comma-separated list of page titles to import (default: all)
+#  --pandoc-subprocess => run one pandoc process per page instead of a persistent pandoc server
+#  --no-conversion-cache => convert every page again, instead of reusing unchanged conversion results
+#  --html-parser => HTML parser used to rewrite pages into storage format: html.parser (default) or lxml (faster, if installed)
+#  --concurrency => number of pages created in parallel (children start as soon as their parent exists)
+#  --upload-workers => number of attachment uploads (multipart requests of several files) sent in parallel
+#  --compile-only => only convert pages into storage format files + manifest (see --compiled-dir), without contacting Confluence
+#  --publish => import pages converted by a previous --compile-only run, without converting them again
+#  --compiled-dir => folder of --compile-only output (default: <input>/.compiled)
+#  --compile-workers => number of processes converting pages (default: one per CPU)
+#  --pipeline-window => maximum number of pages converted ahead of the ones created in Confluence
 #  --help => show this help
 def parse_args():
     import argparse
@@ -917,8 +1629,19 @@ def parse_args():
     parser.add_argument('--confluence-page-suffix', type=str, default=CONFLUENCE_TITLE_SUFFIX, help='Suffix to add to all page titles')
     parser.add_argument('--origin-url', type=str, help='Original redmine instance URL (for link conversion)')
     parser.add_argument('--overwrite', type=str, help='Overwrite existing pages')
+    parser.add_argument('--overwrite-mode', type=str, choices=['update', 'recreate'], default=CONFLUENCE_OVERWRITE_MODE, help='Update overwritten pages in place, only when changed (default), or delete and create them again')
     parser.add_argument('--fail-fast', action='store_true', help='Stop on first error')
     parser.add_argument('--pages', type=str, help='Comma-separated list of page titles to import (default: all)')
+    parser.add_argument('--pandoc-subprocess', action='store_true', help='Run one pandoc process per page instead of a persistent pandoc server')
+    parser.add_argument('--no-conversion-cache', action='store_true', help='Convert every page again, instead of reusing unchanged conversion results')
+    parser.add_argument('--html-parser', type=str, choices=['html.parser', 'lxml'], default=HTML_PARSER, help='HTML parser used to rewrite pages into storage format (lxml is faster, if installed)')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='Number of pages created in parallel (children start as soon as their parent exists)')
+    parser.add_argument('--upload-workers', type=int, default=ATTACHMENT_WORKERS, help='Number of attachment uploads (multipart requests of several files) sent in parallel')
+    parser.add_argument('--compile-only', action='store_true', help='Only convert pages into storage format files and a manifest, without contacting Confluence')
+    parser.add_argument('--publish', action='store_true', help='Import pages converted by a previous --compile-only run, without converting them again')
+    parser.add_argument('--compiled-dir', type=str, help='Folder of --compile-only output (default: <input>/.compiled)')
+    parser.add_argument('--compile-workers', type=int, default=COMPILE_WORKERS, help='Number of processes converting pages (default: one per CPU)')
+    parser.add_argument('--pipeline-window', type=int, default=PIPELINE_WINDOW, help='Maximum number of pages converted ahead of the ones created in Confluence')
     args = parser.parse_args()
     return args
 
@@ -926,8 +1649,10 @@ def parse_args():
 def main():
     global wiki_dir, confluence, auth
     global CONFLUENCE_URL, CONFLUENCE_USER, CONFLUENCE_API_TOKEN, CONFLUENCE_PARENT_FOLDER
-    global CONFLUENCE_SPACE_ID, CONFLUENCE_SPACE_KEY, CONFLUENCE_PAGE_ROOT, CONFLUENCE_OVERWRITE_EXISTING
+    global CONFLUENCE_SPACE_ID, CONFLUENCE_SPACE_KEY, CONFLUENCE_PAGE_ROOT, CONFLUENCE_OVERWRITE_EXISTING, CONFLUENCE_OVERWRITE_MODE
     global PAGES, FAIL_FAST, REDMINE_ORIGIN_URL, CONFLUENCE_TITLE_SUFFIX
+    global CONVERSION_CACHE, STAGE_FINGERPRINTS, HTML_PARSER, CONCURRENCY, ATTACHMENT_WORKERS
+    global COMPILE_WORKERS, PIPELINE_WINDOW
     args = parse_args()
 
     wiki_dir = args.input
@@ -935,16 +1660,29 @@ def main():
     CONFLUENCE_USER = args.confluence_user
     CONFLUENCE_API_TOKEN = args.confluence_token
     CONFLUENCE_SPACE_KEY = args.confluence_space
-    CONFLUENCE_SPACE_ID = get_spaceid_by_key(CONFLUENCE_SPACE_KEY)
     CONFLUENCE_PAGE_ROOT = args.confluence_page_root
     CONFLUENCE_OVERWRITE_EXISTING = args.overwrite.split(',') if args.overwrite else []
+    CONFLUENCE_OVERWRITE_MODE = args.overwrite_mode
     REDMINE_ORIGIN_URL = args.origin_url
     FAIL_FAST = args.fail_fast
-
-    auth = (CONFLUENCE_USER, CONFLUENCE_API_TOKEN)
-
-    if args.confluence_folder:
-        CONFLUENCE_PARENT_FOLDER = get_folder_id_by_name(args.confluence_folder)
+    CONCURRENCY = args.concurrency
+    ATTACHMENT_WORKERS = args.upload_workers
+    COMPILE_WORKERS = args.compile_workers
+    PIPELINE_WINDOW = args.pipeline_window
+    pandoc_engine.USE_SERVER = not args.pandoc_subprocess
+
+    if args.html_parser == 'lxml':
+        try:
+            import lxml
+        except ImportError:
+            print("❌ --html-parser lxml requires the lxml package (pip install lxml).")
+            exit()
+    HTML_PARSER = args.html_parser
+
+    if args.compile_only and args.publish:
+        print("❌ --compile-only and --publish are separate runs, pass only one of them.")
+        exit()
+    compiled_dir = args.compiled_dir or os.path.join(wiki_dir, COMPILE_FOLDER)
 
     if args.confluence_page_suffix:
         CONFLUENCE_TITLE_SUFFIX = args.confluence_page_suffix
@@ -953,6 +1691,20 @@ def main():
         PAGES = [p.strip() for p in args.pages.split(',')]
         print(f"Importing only specified pages: {PAGES}")
 
+    if not args.no_conversion_cache:
+        CONVERSION_CACHE = conversion_cache.ConversionCache(os.path.join(wiki_dir, conversion_cache.CACHE_FOLDER))
+        STAGE_FINGERPRINTS = stage_fingerprints()
+
+    if args.compile_only:
+        compile_wiki(wiki_dir, compiled_dir)
+        return
+
+    auth = (CONFLUENCE_USER, CONFLUENCE_API_TOKEN)
+    CONFLUENCE_SPACE_ID = get_spaceid_by_key(CONFLUENCE_SPACE_KEY)
+
+    if args.confluence_folder:
+        CONFLUENCE_PARENT_FOLDER = get_folder_id_by_name(args.confluence_folder)
+
     confluence = Confluence(
         url=CONFLUENCE_URL,
         username=CONFLUENCE_USER,
@@ -960,7 +1712,7 @@ def main():
         cloud=True
     )
 
-    create_confluence_wiki(wiki_dir)
+    create_confluence_wiki(wiki_dir, compiled_dir if args.publish else None)
 
 
 if __name__ == "__main__":
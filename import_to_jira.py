@@ -1,11 +1,17 @@
 import os
 import re
 import json
+import gzip
+import sqlite3
+import heapq
+import tempfile
 import requests
 import time
-import subprocess
+import pandoc_engine
+import conversion_cache
 from pprint import pprint
 from datetime import datetime
+from redmine_common import issue_text
 
 # === Jira configuration ===
 JIRA_URL = None
@@ -18,6 +24,10 @@ redmine_issues_folder = None
 
 auth = None
 
+# === Cache of description conversions (under redmine_issues_folder) ===
+CONVERSION_CACHE = None
+STAGE_FINGERPRINTS = {}
+
 # === Modify this mapping based on your mapping, "REDMINE" : "JIRA"===
 
 issue_type_map = {
@@ -187,12 +197,14 @@ def preprocess_redmine_plaintext(text):
     return text
 
 def textile_to_markdown_with_pandoc(textile_text):
-    proc = subprocess.run(
-        ['pandoc', '--from=textile', '--to=markdown'],
-        input=textile_text.encode('utf-8'),
-        stdout=subprocess.PIPE
-    )
-    return proc.stdout.decode('utf-8')
+    return pandoc_engine.convert(textile_text, 'textile', 'markdown')
+
+def convert_description(description_textile):
+    """ Convert an issue description to markdown, reusing cached results of unchanged descriptions. """
+    if not CONVERSION_CACHE:
+        return textile_to_markdown_with_pandoc(preprocess_redmine_plaintext(description_textile))
+    preprocessed = CONVERSION_CACHE.cached('preprocess', STAGE_FINGERPRINTS['preprocess'], preprocess_redmine_plaintext, description_textile)
+    return CONVERSION_CACHE.cached('markdown', STAGE_FINGERPRINTS['markdown'], textile_to_markdown_with_pandoc, preprocessed)
 
 def adf_heading(text, level=3):
     return {
@@ -361,6 +373,20 @@ def attach_file_to_jira(issue_key, file_path):
             print(f"   🔄 Retrying to upload file '{os.path.basename(file_path)}' (Attempt {attempt + 2}/{max_retries})")
             time.sleep(attempt)
 
+def attach_issue_text(issue_key, redmine_issue, txt_path):
+    """
+    Attach the readable issue_<id>.txt. Compact exports (jsonl/sqlite) do not have it,
+    so it is generated from the issue record into a temporary file.
+    """
+    if os.path.exists(txt_path):
+        attach_file_to_jira(issue_key, txt_path)
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, os.path.basename(txt_path))
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(issue_text(redmine_issue))
+        attach_file_to_jira(issue_key, tmp_path)
+
 def try_get_transition_fields(obj, keys):
     return {(try_get_field_id_for(k) or k): obj.get(k, None) for k in keys if k in obj}
 
@@ -436,8 +462,7 @@ def create_jira_issue(redmine_issue):
     description_textile = redmine_issue.get('description', '')
     description_markdown = ""
     if description_textile:
-        preprocessed = preprocess_redmine_plaintext(description_textile)
-        description_markdown = textile_to_markdown_with_pandoc(preprocessed)
+        description_markdown = convert_description(description_textile)
     else:
         description_markdown = "No description."
 
@@ -580,8 +605,7 @@ def create_jira_issue(redmine_issue):
             issue_key = resp2.json()["key"]
             print(f"✅ Created Jira issue (summary only): {issue_key} for Redmine #{issue_id}")
             # Attach both .txt and comments.txt as files
-            if os.path.exists(txt_path):
-                attach_file_to_jira(issue_key, txt_path)
+            attach_issue_text(issue_key, redmine_issue, txt_path)
             if os.path.exists(comments_txt_path):
                 attach_file_to_jira(issue_key, comments_txt_path)
             return issue_key
@@ -592,8 +616,7 @@ def create_jira_issue(redmine_issue):
         issue_key = resp.json()["key"]
         print(f"✅ Created Jira issue: {issue_key} for Redmine #{issue_id}")
         # Attach both .txt and comments.txt as files
-        if os.path.exists(txt_path):
-            attach_file_to_jira(issue_key, txt_path)
+        attach_issue_text(issue_key, redmine_issue, txt_path)
         if os.path.exists(comments_txt_path):
             attach_file_to_jira(issue_key, comments_txt_path)
     else:
@@ -746,7 +769,7 @@ def delete_jira_issue(issue_key):
     raise Exception(f"Failed to delete Jira issue {resp.status_code} -> {issue_key}")
 
 # Parse arguments:
-#  --input => path to folder with Redmine issues (default: 'redmine-issues')
+#  --input => path to folder with Redmine issues (default: 'redmine-issues'), or to its issues.sqlite / issues.jsonl.gz
 #  --jira-url => Jira instance URL
 #  --jira-user => Jira user email
 #  --jira-token => Jira API token
@@ -760,11 +783,13 @@ def delete_jira_issue(issue_key):
 #  --overwrite => overwrite (delete+create) existing issues
 #  --fail-fast => stop on first error
 #  --update => update existing issues instead of creating new ones
+#  --pandoc-subprocess => run one pandoc process per issue instead of a persistent pandoc server
+#  --no-conversion-cache => convert every description again, instead of reusing unchanged conversion results
 #  --help => show this help
 def parse_args():
     import argparse
     parser = argparse.ArgumentParser(description="Import Redmine issues to Jira.")
-    parser.add_argument("--input", type=str, default="redmine-issues", help="Path to folder with Redmine issues")
+    parser.add_argument("--input", type=str, default="redmine-issues", help="Path to folder with Redmine issues (or to its issues.sqlite / issues.jsonl.gz)")
     parser.add_argument("--jira-url", type=str, required=True, help="Jira instance URL")
     parser.add_argument("--jira-user", type=str, required=True, help="Jira user email")
     parser.add_argument("--jira-token", type=str, required=True, help="Jira API token")
@@ -778,6 +803,8 @@ def parse_args():
     parser.add_argument("--overwrite", action="store_true", help="Overwrite (delete+create) existing issues")
     parser.add_argument("--fail-fast", action="store_true", help="Stop on first error")
     parser.add_argument("--update", action="store_true", help="Update existing issues instead of creating new ones")
+    parser.add_argument("--pandoc-subprocess", action="store_true", help="Run one pandoc process per issue instead of a persistent pandoc server")
+    parser.add_argument("--no-conversion-cache", action="store_true", help="Convert every description again, instead of reusing unchanged conversion results")
     return parser.parse_args()
 
 def readfile(path):
@@ -791,16 +818,93 @@ def extract_issueid_from(filename):
         return int(m.group(1))
     return float('inf')
 
+def iter_jsonl_segment(folder, index, segment):
+    """
+    Yield ((id, index), issue) for each complete line of a segment.
+    Raises if the segment is not sorted by id, the merge would yield duplicates.
+    """
+    previous = None
+    with gzip.open(os.path.join(folder, segment), 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.endswith('\n'):
+                    issue = json.loads(line)
+                    if previous is not None and issue['id'] < previous:
+                        raise Exception(f"Segment '{segment}' is not sorted by id (issue #{issue['id']} after #{previous}), export the project again without --incremental/--resume")
+                    previous = issue['id']
+                    yield ((issue['id'], index), issue)
+        except EOFError:
+            print(f"⚠️  Segment '{segment}' is truncated, using the issues read so far.")
+
+def iter_jsonl_issues(path):
+    """
+    Read issues from the exporter's JSON Lines output: issues.jsonl.gz plus any
+    issues.<timestamp>.jsonl.gz segments added by incremental runs, which take
+    precedence. A segment truncated by a crash is read up to its last complete line.
+    The exporter writes every segment sorted by id, so segments are merged while
+    streaming, holding one issue per segment in memory.
+    """
+    folder = os.path.dirname(path) or '.'
+    segments = sorted(
+        (f for f in os.listdir(folder) if f.startswith('issues') and f.endswith('.jsonl.gz')),
+        key=lambda f: (f != 'issues.jsonl.gz', f)
+    )
+    streams = [iter_jsonl_segment(folder, index, segment) for index, segment in enumerate(segments)]
+    current = None
+    # Records of the same issue come out together, the one of the latest segment last
+    for (issue_id, _), issue in heapq.merge(*streams, key=lambda item: item[0]):
+        if current is not None and issue_id != current[0]:
+            yield current[1]
+        current = (issue_id, issue)
+    if current is not None:
+        yield current[1]
+
+def iter_sqlite_issues(path):
+    db = sqlite3.connect(path)
+    try:
+        for (data,) in db.execute('SELECT data FROM issues ORDER BY id'):
+            yield json.loads(data)
+    finally:
+        db.close()
+
+def iter_folder_issues(folder):
+    for fname in sorted(os.listdir(folder), key=extract_issueid_from):
+        # Skip the exporter's state/checkpoint files (.export_*.json)
+        if not fname.endswith(".json") or fname.startswith("."):
+            continue
+        with open(os.path.join(folder, fname), "r", encoding="utf-8") as f:
+            yield json.load(f)
+
+def iter_redmine_issues(input_path):
+    """
+    Yield exported Redmine issues sorted by id, from any of the exporter formats:
+    a folder of issue_<id>.json files, issues.sqlite or issues.jsonl.gz.
+    """
+    if input_path.endswith('.sqlite'):
+        return iter_sqlite_issues(input_path)
+    if input_path.endswith('.jsonl.gz'):
+        return iter_jsonl_issues(input_path)
+    return iter_folder_issues(input_path)
+
 def main():
     global JIRA_URL, JIRA_USER, JIRA_API_TOKEN, JIRA_PROJECT_KEY, redmine_issues_folder, auth
+    global CONVERSION_CACHE, STAGE_FINGERPRINTS
     args = parse_args()
 
     JIRA_URL = args.jira_url
     JIRA_USER = args.jira_user
     JIRA_API_TOKEN = readfile(args.jira_token.lstrip('@')) if args.jira_token.startswith('@') else args.jira_token
     JIRA_PROJECT_KEY = args.jira_project
-    redmine_issues_folder = args.input
+    pandoc_engine.USE_SERVER = not args.pandoc_subprocess
+    # Attachments (and .txt files) are looked up next to compact (single-file) exports
+    redmine_issues_folder = args.input if os.path.isdir(args.input) else (os.path.dirname(args.input) or '.')
     auth = (JIRA_USER, JIRA_API_TOKEN)
+    if not args.no_conversion_cache:
+        CONVERSION_CACHE = conversion_cache.ConversionCache(os.path.join(redmine_issues_folder, conversion_cache.CACHE_FOLDER))
+        STAGE_FINGERPRINTS = {
+            'preprocess': conversion_cache.fingerprint(preprocess_redmine_plaintext),
+            'markdown': conversion_cache.fingerprint(textile_to_markdown_with_pandoc, pandoc_engine.version()),
+        }
     # read user mappings from 'emails.csv', if present on script's folder
     if args.emails:
         emails_csv_path = os.path.join(os.path.dirname(__file__), args.emails)
@@ -823,12 +927,7 @@ def main():
     if args.issue_ids:
         issue_ids_filter = set(int(i) for i in args.issue_ids.split(",") if i.strip().isdigit())
 
-    for fname in sorted(os.listdir(redmine_issues_folder), key=extract_issueid_from):
-        if not fname.endswith(".json"):
-            continue
-        with open(os.path.join(redmine_issues_folder, fname), "r", encoding="utf-8") as f:
-            redmine_issue = json.load(f)
-
+    for redmine_issue in iter_redmine_issues(args.input):
         if args.issue_id and redmine_issue.get('id') != args.issue_id:
             continue
 
@@ -885,5 +984,8 @@ def main():
             errfile.write(f"Failed to import Redmine issue #{redmine_issue.get('id')}\n")
         time.sleep(0.250)  # Polite delay
 
+    if CONVERSION_CACHE:
+        CONVERSION_CACHE.report()
+
 if __name__ == "__main__":
     main()
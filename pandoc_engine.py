@@ -0,0 +1,141 @@
+import time
+import socket
+import atexit
+import threading
+import subprocess
+import requests
+
+# === Document conversion with pandoc, shared by import_to_confluence.py and import_to_jira.py ===
+# Documents are sent to a long-lived `pandoc server` process over HTTP, so pandoc starts
+# once per run instead of once per page/issue. If the server cannot be started (e.g. a
+# pandoc build without server support), one pandoc process is run per document instead.
+
+PANDOC = 'pandoc'
+
+# Set to False to always run one pandoc process per document
+USE_SERVER = True
+
+# Seconds pandoc server allows a single conversion (its own default is 2)
+SERVER_TIMEOUT = 300
+
+# Seconds to wait for the server to accept connections
+SERVER_START_TIMEOUT = 10
+
+_version = None
+_server = None
+_server_url = None
+_server_failed = False
+_session = None
+_lock = threading.Lock()
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server():
+    """ Start pandoc server (once), returns its URL, or None if it is not available. """
+    global _server, _server_url, _server_failed, _session
+    with _lock:
+        if _server_url or _server_failed:
+            return _server_url
+
+        port = _free_port()
+        try:
+            _server = subprocess.Popen(
+                [PANDOC, 'server', '--port', str(port), '--timeout', str(SERVER_TIMEOUT)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError as ex:
+            print(f"   ⚠️  Could not start pandoc server ({ex}), running pandoc once per document.")
+            _server_failed = True
+            return None
+
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while time.time() < deadline and _server.poll() is None:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                _server_url = f'http://127.0.0.1:{port}/'
+                _session = requests.Session()
+                return _server_url
+            except OSError:
+                time.sleep(0.1)
+
+        print("   ⚠️  pandoc server did not start, running pandoc once per document.")
+        _server_failed = True
+        if _server.poll() is None:
+            _server.kill()
+        _server = None
+        return None
+
+def stop_server():
+    global _server, _server_url
+    with _lock:
+        if _server and _server.poll() is None:
+            _server.terminate()
+            try:
+                _server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                _server.kill()
+        _server = None
+        _server_url = None
+
+atexit.register(stop_server)
+
+def version():
+    """ First line of `pandoc --version` (identifies the converter, e.g. for conversion caches), or None. """
+    global _version
+    if _version is None:
+        try:
+            proc = subprocess.run([PANDOC, '--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            _version = proc.stdout.decode('utf-8', 'replace').split('\n', 1)[0]
+        except OSError:
+            _version = ''
+    return _version or None
+
+def convert_with_subprocess(text, from_format, to_format, wrap=None):
+    """ Convert text with a pandoc process of its own. """
+    cmd = [PANDOC, f'--from={from_format}', f'--to={to_format}']
+    if wrap:
+        cmd.append(f'--wrap={wrap}')
+    proc = subprocess.run(
+        cmd,
+        input=text.encode('utf-8'),
+        stdout=subprocess.PIPE
+    )
+    return proc.stdout.decode('utf-8')
+
+def convert_with_server(url, text, from_format, to_format, wrap=None):
+    """ Convert text on a running pandoc server, returns None if the server could not convert it. """
+    global _server_failed
+    options = {'text': text, 'from': from_format, 'to': to_format}
+    if wrap:
+        options['wrap'] = wrap
+    try:
+        response = _session.post(url, json=options, headers={'Accept': 'application/json'}, timeout=SERVER_TIMEOUT + 10)
+    except requests.RequestException as ex:
+        print(f"   ⚠️  pandoc server failed ({ex}), running pandoc once per document.")
+        _server_failed = True
+        return None
+    if response.status_code != 200:
+        print(f"   ⚠️  pandoc server could not convert document ({response.status_code}), retrying with pandoc.")
+        return None
+    output = response.json().get('output', '')
+    # The pandoc command line ends (non standalone) documents with a newline, the server does not
+    if not output.endswith('\n'):
+        output += '\n'
+    return output
+
+def convert(text, from_format, to_format, wrap=None):
+    """
+    Convert text from from_format to to_format (pandoc format names), with the optional
+    --wrap mode. Same output as `pandoc --from=.. --to=.. [--wrap=..]` on the text.
+    """
+    url = start_server() if USE_SERVER and not _server_failed else None
+    if url:
+        output = convert_with_server(url, text, from_format, to_format, wrap)
+        if output is not None:
+            return output
+    return convert_with_subprocess(text, from_format, to_format, wrap)
@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# === Helpers shared by export_redmine_issues.py and export_redmine_wiki.py ===
+
+# Size of the chunks streamed to disk, bounds memory use regardless of file size
+CHUNK_SIZE = 1024 * 1024
+
+# Suffix of partially downloaded files (resumed with HTTP Range on next attempt)
+PART_SUFFIX = '.part'
+
+# Redmine attachment digests: MD5 for attachments created before Redmine 4.0, SHA256 after
+DIGEST_ALGORITHMS = {32: 'md5', 64: 'sha256'}
+
+# Responses kept by the HTTP cache (404s too, so offline replays see missing pages/versions as such)
+CACHEABLE_STATUS = (200, 404)
+
+# Headers not stored with cached responses, as their body is kept decoded
+UNCACHED_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding', 'Connection', 'Set-Cookie')
+
+# Share of --http-cache-size kept after an eviction, so evictions do not happen on every write
+CACHE_EVICT_RATIO = 0.9
+
+
+class CachedSession(requests.Session):
+    """
+    requests.Session keeping the responses to (non-streamed) GET requests in an on-disk
+    cache, one file per URL holding a JSON header line followed by the body.
+    Cached responses are revalidated with If-None-Match/If-Modified-Since, so unchanged
+    ones only cost a 304. Files are touched when used, and the least recently used ones
+    evicted once the cache grows past max_size bytes.
+    In offline mode nothing is sent to the server: cached responses are replayed, and
+    anything else gets a 504 (as an HTTP cache answers 'only-if-cached' requests).
+    """
+
+    def __init__(self, root, max_size=None, offline=False):
+        super().__init__()
+        self.cache_root = root
+        self.cache_max_size = max_size
+        self.offline = offline
+        self.cache_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.cache_size = sum(size for _, size, _ in self._cache_entries())
+
+    def _cache_entries(self):
+        """ (mtime, size, path) of every cached response. """
+        for dirpath, _, filenames in os.walk(self.cache_root):
+            for fname in filenames:
+                if fname.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield (st.st_mtime, st.st_size, path)
+
+    def _cache_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_root, key[:2], key)
+
+    def _load(self, path):
+        """ Return (meta, body) of a cached response, or None. """
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+        return (meta, body)
+
+    def _store(self, path, response):
+        headers = {k: v for k, v in response.headers.items() if k not in UNCACHED_HEADERS}
+        data = json.dumps({'status': response.status_code, 'headers': headers}).encode('utf-8') + b'\n' + response.content
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique across threads and processes, several exporters may share the same cache
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        with self.cache_lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.cache_size += len(data) - previous
+            if self.cache_max_size and self.cache_size > self.cache_max_size:
+                self._evict()
+
+    def _evict(self):
+        """ Remove least recently used responses, until the cache is back under CACHE_EVICT_RATIO of its size. """
+        target = self.cache_max_size * CACHE_EVICT_RATIO
+        for _, size, path in sorted(self._cache_entries()):
+            if self.cache_size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.cache_size -= size
+
+    def _response(self, url, status, headers=None, body=b''):
+        """ Build a response served from the cache. """
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers or {})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = url
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def request(self, method, url, **kwargs):
+        if method.upper() != 'GET' or kwargs.get('stream'):
+            # Downloads (streamed) are not cached, they are skipped when already on disk
+            if self.offline:
+                return self._response(url, 504)
+            return super().request(method, url, **kwargs)
+
+        url = requests.Request('GET', url, params=kwargs.pop('params', None)).prepare().url
+        path = self._cache_path(url)
+        cached = self._load(path)
+
+        if self.offline:
+            return self._response(url, cached[0]['status'], cached[0]['headers'], cached[1]) if cached else self._response(url, 504)
+
+        if cached:
+            cached_headers = CaseInsensitiveDict(cached[0]['headers'])
+            conditional = {}
+            if 'ETag' in cached_headers:
+                conditional['If-None-Match'] = cached_headers['ETag']
+            if 'Last-Modified' in cached_headers:
+                conditional['If-Modified-Since'] = cached_headers['Last-Modified']
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **conditional}
+
+        response = super().request(method, url, **kwargs)
+        if response.status_code == 304 and cached:
+            return self._response(url, cached[0]['status'], cached[0]['headers'], cached[1])
+        if response.status_code in CACHEABLE_STATUS:
+            self._store(path, response)
+        return response
+
+def create_session(headers, pool_size=10, cache_dir=None, cache_max_size=None, offline=False):
+    """
+    Create a requests session with the given (auth) headers, so connections to
+    Redmine are kept alive and reused instead of opening one per request.
+    With cache_dir, GET responses are kept in an on-disk cache (see CachedSession).
+    """
+    s = CachedSession(cache_dir, cache_max_size, offline) if cache_dir else requests.Session()
+    s.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+def fetch_projects(session, base_url, limit=100):
+    """ List the identifiers of all projects visible to the session's credentials, following /projects.json pagination. """
+    projects = []
+    offset = 0
+    while True:
+        response = session.get(f'{base_url}/projects.json?offset={offset}&limit={limit}')
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch projects list: {response.status_code}\n{response.text}")
+        data = response.json()
+        page = data.get('projects', [])
+        if not page:
+            break
+        projects.extend(p['identifier'] for p in page)
+        offset += data.get('limit') or len(page)
+        if offset >= data.get('total_count', offset + 1):
+            break
+    return projects
+
+def issue_text(full_data):
+    """ Readable text version of an issue (issue_<id>.txt), with its comments. """
+    lines = [
+        f"Issue #{full_data.get('id')}\n",
+        f"Subject: {full_data.get('subject')}\n",
+        f"Status: {full_data.get('status', {}).get('name')}\n",
+        f"Tracker: {full_data.get('tracker', {}).get('name')}\n",
+        f"Priority: {full_data.get('priority', {}).get('name')}\n",
+        f"Assigned to: {full_data.get('assigned_to', {}).get('name', 'Unassigned')}\n",
+        f"Author: {full_data.get('author', {}).get('name')}\n",
+        f"Created: {full_data.get('created_on')}\n",
+        f"Updated: {full_data.get('updated_on')}\n",
+        f"Description:\n{full_data.get('description', '')}\n\n",
+    ]
+
+    # Journals (comments)
+    lines.append("--- Comments ---\n")
+    for journal in full_data.get('journals', []):
+        user = journal.get('user', {}).get('name', 'Unknown')
+        notes = journal.get('notes', '')
+        created = journal.get('created_on')
+        if notes:
+            lines.append(f"\n[{created}] {user}:\n{notes}\n")
+    return ''.join(lines)
+
+def file_digest(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_matches(path, filesize=None, digest=None):
+    """
+    Check whether path exists and matches the size and digest reported by Redmine.
+    Checks not backed by Redmine data (missing size, unknown digest kind) are skipped.
+    """
+    if not os.path.isfile(path):
+        return False
+    if filesize is not None and os.path.getsize(path) != filesize:
+        return False
+    algorithm = DIGEST_ALGORITHMS.get(len(digest)) if digest else None
+    if algorithm and file_digest(path, algorithm) != digest.lower():
+        return False
+    return True
+
+def is_attachment_current(path, attachment):
+    """ True when path already holds the given Redmine attachment (so it can be skipped). """
+    return file_matches(path, attachment.get('filesize'), attachment.get('digest'))
+
+def download_file(session, url, path, retries=3, filesize=None, digest=None):
+    """
+    Stream url into path in CHUNK_SIZE chunks.
+    Data goes to '<path>.part' which is renamed to path once complete, so path never
+    holds a truncated file. If a '.part' file is left from a previous (failed) attempt
+    the download is resumed with an HTTP Range request.
+    If filesize/digest are given, the data is verified before the rename, and downloaded
+    again from scratch on mismatch.
+    Returns the HTTP status code, raises if the connection keeps failing or data does not verify.
+    """
+    part_path = path + PART_SUFFIX
+
+    # Offline replays (see CachedSession) use files already on disk as they are
+    if getattr(session, 'offline', False) and os.path.isfile(path):
+        return 200
+
+    for attempt in range(retries):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        req_headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        try:
+            with session.get(url, headers=req_headers, stream=True) as resp:
+                if resp.status_code == 416 and offset:
+                    # Range not satisfiable, partial file is stale: start over
+                    os.remove(part_path)
+                    continue
+                if resp.status_code == 206:
+                    mode = 'ab'
+                elif resp.status_code == 200:
+                    # Server ignored the Range header (or there was none)
+                    mode = 'wb'
+                else:
+                    return resp.status_code
+
+                with open(part_path, mode) as f:
+                    for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+        except requests.RequestException as ex:
+            if attempt + 1 >= retries:
+                raise
+            print(f"   🔄 Download of {os.path.basename(path)} interrupted ({ex}), resuming...")
+            time.sleep(attempt + 1)
+            continue
+
+        if not file_matches(part_path, filesize, digest):
+            print(f"   ⚠️ Downloaded {os.path.basename(path)} does not match Redmine size/digest, retrying...")
+            os.remove(part_path)
+            continue
+
+        os.replace(part_path, path)
+        return 200
+
+    raise Exception(f"Failed to download {url} after {retries} attempts")
+
+def link_file(src, dst):
+    """
+    Make dst point to the same content as src: a hardlink when possible, otherwise
+    a symlink (e.g. blob store on another filesystem), or a plain copy as last resort.
+    """
+    if os.path.lexists(dst):
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src), dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+class BlobStore:
+    """
+    Content-addressed store for downloaded files, shared by all issues/pages of an export.
+    Each blob is stored once as <root>/<xx>/<key>, keyed by the Redmine digest, and
+    the per-issue/per-page files are links into it. Files without digest (e.g. external
+    images) are keyed by their URL and downloaded at most once per run.
+    """
+
+    def __init__(self, session, root):
+        self.session = session
+        self.root = root
+        self.fetched_urls = set()
+        self.locks = {}
+        self.locks_guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _lock_for(self, key):
+        with self.locks_guard:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def blob_path(self, key):
+        # Fan out on the first hash characters, to keep directories small
+        bucket = key.rsplit('-', 1)[-1][:2]
+        return os.path.join(self.root, bucket, key)
+
+    def fetch(self, url, path, filesize=None, digest=None):
+        """ Download url into the store (unless already there) and link it as path. Returns the HTTP status code. """
+        if digest:
+            key = digest.lower()
+        else:
+            key = 'url-' + hashlib.sha256(url.encode('utf-8')).hexdigest()
+        blob = self.blob_path(key)
+
+        # Concurrent requests for the same blob wait for a single download
+        with self._lock_for(key):
+            if digest:
+                current = file_matches(blob, filesize, digest)
+            else:
+                current = key in self.fetched_urls and os.path.isfile(blob)
+            if not current:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                status = download_file(self.session, url, blob, filesize=filesize, digest=digest)
+                if status != 200:
+                    return status
+                if not digest:
+                    self.fetched_urls.add(key)
+
+        link_file(blob, path)
+        return 200